@@ -0,0 +1,92 @@
+#! /usr/bin/env python3
+"""Edge layout benchmark on fully random samples.
+
+Every offset pair of random data has close to rows (at most 256x256) distinct edges
+and 256 nodes per column, the worst case for finding edge endpoints. Times laying
+out the edges of every column pair through value-indexed node tables, and with
+--linear also through the previous scan over the column's nodes per endpoint.
+
+    uv run python benchmarks/bench_edge_layout.py --rows 5000 --sz 512 --linear
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import daguire  # noqa: E402
+
+
+def random_dag(rows: int, sz: int, seed: int) -> daguire.Dag:
+    rng = random.Random(seed)
+    text = "".join(rng.randbytes(sz).hex() + "\n" for _ in range(rows))
+    stdin = sys.stdin
+    sys.stdin = io.StringIO(text)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            return daguire.Dag(None, sz=sz, storage="none")
+    finally:
+        sys.stdin = stdin
+
+
+def place_columns(dag: daguire.Dag) -> list[list[daguire.Node]]:
+    columns = []
+    for o in range(dag.sz):
+        nodes = [daguire.Node(o, v, ct) for v, ct in dag.get_val_counts_by_offset(o) if v is not None]
+        y = 0
+        for node in nodes:
+            node.setcordinates((o * 300, y, o * 300 + 150, y + node.ratio))
+            y += node.ratio + 150
+        columns.append(nodes)
+    return columns
+
+
+def layout_indexed(columns, edges) -> int:
+    placed = 0
+    prev_table = daguire.node_table(columns[0])
+    for o in range(1, len(columns)):
+        table = daguire.node_table(columns[o])
+        placed += len(daguire.layout_edges(prev_table, table, edges[o], o))
+        prev_table = table
+    return placed
+
+
+def layout_linear(columns, edges) -> int:
+    placed = 0
+    for o in range(1, len(columns)):
+        pnodes, nodes = columns[o - 1], columns[o]
+        for src_val, dst_val, _ in edges[o]:
+            src_node = next((n for n in pnodes if n.val == src_val), None)
+            dst_node = next((n for n in nodes if n.val == dst_val), None)
+            if src_node is not None and dst_node is not None:
+                placed += 1
+    return placed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--sz", type=int, default=512)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--linear", action="store_true", help="also time the per-endpoint linear scan")
+    args = parser.parse_args()
+
+    dag = random_dag(args.rows, args.sz, args.seed)
+    columns = place_columns(dag)
+    edges = [[]] + [dag.get_edge_counts_by_offsets(o - 1, o) for o in range(1, args.sz)]
+    total = sum(len(e) for e in edges)
+    print(f"rows={args.rows} sz={args.sz} edges={total:,}")
+
+    strategies = [("indexed", layout_indexed)] + ([("linear", layout_linear)] if args.linear else [])
+    for name, layout in strategies:
+        start = time.perf_counter()
+        placed = layout(columns, edges)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>8}: {elapsed:8.3f}s  {placed / elapsed:12,.0f} edges/s")
+
+
+if __name__ == "__main__":
+    main()
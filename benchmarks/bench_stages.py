@@ -0,0 +1,223 @@
+#! /usr/bin/env python3
+"""Stage benchmark: ingest, query, layout and render on synthetic corpora.
+
+Generates hex samples of one of these corpora into a temporary file, feeds it to a
+Dag on stdin like the command line does, and times every stage separately:
+
+    constant  the same header and body in every sample
+    counter   a 4-byte big-endian row counter followed by a constant body
+    random    uniformly random bytes
+    mixed     a constant magic, a message type, a counter, a length and a random
+              payload of that length, so samples vary in length
+
+Each stage is one JSON line on stdout (corpus, rows, sz, width, storage, stage, seconds and
+the peak bytes Python allocated during it, traced with tracemalloc when --memory is
+given, which slows the stages down). Save a run and pass it to --compare later to
+print the ratio of every stage's time to the earlier one. --width 2 or 4 runs the
+multi-byte field index too (with --storage none), tracking --top values per offset.
+Every run also checks that each node's in-edges and out-edges add up to its count,
+and exits if they do not.
+
+    uv run python benchmarks/bench_stages.py --corpus mixed --rows 10000 100000 --sz 8 64 > before.jsonl
+    uv run python benchmarks/bench_stages.py --corpus mixed --rows 10000 100000 --sz 8 64 --compare before.jsonl
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import daguire  # noqa: E402
+
+# Samples generated per write while filling the corpus file
+GENERATE_BATCH = 4096
+# Columns a window shows at the default zoom, with its margin
+VIEWPORT_COLUMNS = 10
+
+
+def constant_samples(rng: random.Random, sz: int, start: int, n: int) -> list[bytes]:
+    sample = (b"\x7fELF\x02\x01\x01" + bytes(range(sz)))[:sz]
+    return [sample] * n
+
+
+def counter_samples(rng: random.Random, sz: int, start: int, n: int) -> list[bytes]:
+    body = b"\x00" * max(sz - 4, 0)
+    return [((start + i) & 0xFFFFFFFF).to_bytes(4, "big")[:sz] + body for i in range(n)]
+
+
+def random_samples(rng: random.Random, sz: int, start: int, n: int) -> list[bytes]:
+    return [rng.randbytes(sz) for _ in range(n)]
+
+
+def mixed_samples(rng: random.Random, sz: int, start: int, n: int) -> list[bytes]:
+    samples = []
+    for i in range(n):
+        header = b"\xaa\x55" + bytes((rng.choice((1, 2, 3)),)) + ((start + i) & 0xFFFF).to_bytes(2, "big")
+        length = rng.randrange(max(sz - 6, 0) + 1)
+        samples.append((header + bytes((length & 0xFF,)) + rng.randbytes(length))[:sz])
+    return samples
+
+
+CORPORA = {"constant": constant_samples, "counter": counter_samples, "random": random_samples, "mixed": mixed_samples}
+
+
+def write_corpus(path: str, corpus: str, rows: int, sz: int, seed: int):
+    rng = random.Random(seed)
+    generate = CORPORA[corpus]
+    with open(path, "w") as f:
+        for start in range(0, rows, GENERATE_BATCH):
+            f.writelines(s.hex() + "\n" for s in generate(rng, sz, start, min(GENERATE_BATCH, rows - start)))
+
+
+class Stages:
+    """Times each stage and, when tracing, the peak memory it allocated."""
+
+    def __init__(self, trace: bool, **run):
+        self.trace = trace
+        self.run = run
+        self.results = []
+
+    @contextlib.contextmanager
+    def __call__(self, stage: str):
+        if self.trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak = None
+            if self.trace:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            result = dict(self.run, stage=stage, seconds=round(seconds, 6), peak_bytes=peak)
+            self.results.append(result)
+            print(json.dumps(result), flush=True)
+
+
+def ingest(path: str, sz: int, storage: str, width: int = 1, top: int = 64) -> daguire.Dag:
+    conn = sqlite3.connect(":memory:") if storage == "sqlite" else None
+    stdin = sys.stdin
+    with open(path) as f, contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        sys.stdin = f
+        try:
+            return daguire.Dag(conn, sz=sz, storage=storage, width=width, top=top)
+        finally:
+            sys.stdin = stdin
+
+
+def check_flows(dag: daguire.Dag):
+    """Exit unless every node's edges to the next offset, and from the previous one, add up to its count."""
+    for o in range(dag.sz - 1):
+        out, into = {}, {}
+        for src, dst, ct in dag.get_edge_counts_by_offsets(o, o + 1):
+            out[src] = out.get(src, 0) + ct
+            into[dst] = into.get(dst, 0) + ct
+        if out != dict(dag.get_val_counts_by_offset(o)) or into != dict(dag.get_val_counts_by_offset(o + 1)):
+            raise SystemExit(f"edges between offsets {o} and {o + 1} do not add up to the node counts")
+
+
+def draw(dag: daguire.Dag):
+    from daguire_gui import CanvasApp
+
+    app = CanvasApp(dag)
+    app.withdraw()
+    app._clear_items()
+    app.draw_dag()
+    app.update_idletasks()
+    app.destroy()
+
+
+def run_stages(stages: Stages, path: str, sz: int, storage: str, width: int, top: int, gui: bool):
+    with stages("ingest"):
+        dag = ingest(path, sz, storage, width, top)
+    check_flows(dag)
+    with stages("val_counts"):
+        for o in range(dag.sz):
+            dag.get_val_counts_by_offset(o)
+    with stages("edge_counts"):
+        for o in range(dag.sz - 1):
+            dag.get_edge_counts_by_offsets(o, o + 1)
+    with stages("offset_stats"):
+        list(dag.offset_stats())  # computed per offset on first access
+    # Seed the filters with the most frequent value in the middle of the samples
+    o = dag.sz // 2
+    seeds = {(o, v) for v, _ in dag.get_val_counts_by_offset(o)[-1:]}
+    with stages("filter"):
+        dag.get_visible_nodes_filtered(seeds)
+    if dag.records is not None:
+        with stages("match"):
+            daguire.MatchedDag(dag, seeds)
+    # A window only places the columns in view, an export all of them
+    with stages("viewport"):
+        layout = daguire.LayoutEngine(dag).layout()
+        for column in range(o, min(o + VIEWPORT_COLUMNS, dag.sz)):
+            layout.edges[column]
+    with stages("layout"):
+        layout = daguire.LayoutEngine(dag).layout()
+        for column in range(dag.sz):
+            layout.edges[column]
+    with tempfile.TemporaryDirectory() as tmp:
+        with stages("svg"):
+            daguire.write_svg(layout, os.path.join(tmp, "dag.svg"))
+    if gui:
+        with stages("draw"):
+            draw(dag)
+
+
+def compare(results: list[dict], path: str):
+    def key(r):
+        return (r["corpus"], r["rows"], r["sz"], r.get("width", 1), r["storage"], r["stage"])
+
+    with open(path) as f:
+        before = {key(r): r for r in (json.loads(line) for line in f if line.strip())}
+    print(f"{'corpus':>8} {'rows':>10} {'sz':>5} {'storage':>7} {'stage':>12} {'before':>9} {'now':>9} {'ratio':>6}", file=sys.stderr)
+    for r in results:
+        old = before.get(key(r))
+        if old is None:
+            continue
+        ratio = r["seconds"] / old["seconds"] if old["seconds"] else float("inf")
+        print(f"{r['corpus']:>8} {r['rows']:>10,} {r['sz']:>5} {r['storage']:>7} {r['stage']:>12} {old['seconds']:9.3f} {r['seconds']:9.3f} {ratio:6.2f}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", nargs="+", choices=sorted(CORPORA), default=["mixed"])
+    parser.add_argument("--rows", nargs="+", type=int, default=[10_000], help="rows per corpus, e.g. 10000 1000000 10000000")
+    parser.add_argument("--sz", nargs="+", type=int, default=[8], help="DAG sizes, e.g. 8 64 1999")
+    parser.add_argument("--storage", nargs="+", choices=sorted(daguire.STORAGE_BACKENDS), default=["array"])
+    parser.add_argument("--width", nargs="+", type=int, choices=(1, 2, 4), default=[1], help="bytes per field; 2 and 4 only run with --storage none")
+    parser.add_argument("--top", type=int, default=64, metavar="K", help="values tracked per offset of a multi-byte field [64]")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--memory", action="store_true", help="trace each stage's peak allocations with tracemalloc (slower)")
+    parser.add_argument("--gui", action="store_true", help="also time drawing the window (needs a display)")
+    parser.add_argument("--compare", metavar="JSONL", help="print each stage's time relative to this earlier run on stderr")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "corpus.hex")
+        for corpus in args.corpus:
+            for rows in args.rows:
+                for sz in args.sz:
+                    write_corpus(path, corpus, rows, sz, args.seed)
+                    for width in args.width:
+                        for storage in args.storage:
+                            if sz > (getattr(daguire.STORAGE_BACKENDS[storage], "MAX_SZ", None) or sz) or (width > 1 and storage != "none"):
+                                continue
+                            stages = Stages(args.memory, corpus=corpus, rows=rows, sz=sz // width, width=width, storage=storage)
+                            run_stages(stages, path, sz // width, storage, width, args.top, args.gui)
+                            results += stages.results
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
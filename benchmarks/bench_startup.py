@@ -0,0 +1,137 @@
+#! /usr/bin/env python3
+"""Startup benchmark: import time and wall time of short daguire invocations.
+
+Pipelines that run daguire once per capture pay its startup every time, so this runs
+a few short invocations in fresh interpreters under `python -X importtime`:
+
+    import    import daguire, as the window and other tools do
+    help      daguire -h
+    counts    a headless JSON export of a small hex input with --storage none
+    sqlite    the same with the default sqlite storage
+    svg       a headless SVG export
+
+Each is one JSON line on stdout (scenario, the best wall seconds and import seconds
+of --repeat runs, and the number of modules imported). Bytecode caching is enabled
+for the runs even if PYTHONDONTWRITEBYTECODE is set, as an installed daguire would
+have it. --budget fails the run when a scenario's imports take longer than that
+many milliseconds (BUDGET_MS unless given), and a scenario that imports one of the
+modules it should not (tkinter and multiprocessing anywhere, sqlite3 outside the
+sqlite scenario) always fails it. --top lists the slowest imports of each scenario on stderr.
+
+    uv run python benchmarks/bench_startup.py > before.jsonl
+    uv run python benchmarks/bench_startup.py --compare before.jsonl --budget 50
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Arguments per scenario, None meaning a plain import; "{out}" is replaced by an output path
+SCENARIOS = {
+    "import": None,
+    "help": ["-h"],
+    "counts": ["hex", "8", "--storage", "none", "--headless", "--json", "{out}.json"],
+    "sqlite": ["hex", "8", "--headless", "--json", "{out}.json"],
+    "svg": ["hex", "8", "--storage", "none", "--headless", "--svg", "{out}.svg"],
+}
+# Modules that must stay unloaded in every scenario but those listed
+FORBIDDEN = {"tkinter": (), "sqlite3": ("sqlite",), "multiprocessing": ()}
+INPUT_ROWS = 100
+# Import milliseconds a scenario may take, interpreter startup included; tests/test_startup.py holds every scenario to it
+BUDGET_MS = 100
+
+
+def run(args, stdin_path: str, out: str) -> tuple[float, list[tuple[str, int, int]]]:
+    """Wall seconds of one run and its (module, self us, cumulative us) imports."""
+    if args is None:
+        code = "import daguire"
+    else:
+        argv = ["daguire"] + [a.replace("{out}", out) for a in args]
+        code = f"import sys; sys.argv = {argv!r}; import daguire; daguire.main()"
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    with open(stdin_path) as stdin:
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], stdin=stdin, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, env=env)
+        seconds = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise SystemExit(f"{args}: exited with {proc.returncode}\n{proc.stderr[-2000:]}")
+    imports = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        imports.append((name.strip(), int(own), int(cumulative)))
+    return seconds, imports
+
+
+def compare(results: list[dict], path: str):
+    with open(path) as f:
+        before = {r["scenario"]: r for r in (json.loads(line) for line in f if line.strip())}
+    print(f"{'scenario':>8} {'before':>9} {'now':>9} {'ratio':>6}  (import ms)", file=sys.stderr)
+    for r in results:
+        old = before.get(r["scenario"])
+        if old is None:
+            continue
+        ratio = r["import_seconds"] / old["import_seconds"] if old["import_seconds"] else float("inf")
+        print(f"{r['scenario']:>8} {old['import_seconds'] * 1000:9.1f} {r['import_seconds'] * 1000:9.1f} {ratio:6.2f}", file=sys.stderr)
+
+
+def measure(scenarios, repeat: int = 5, budget: float | None = None) -> tuple[list[dict], list[dict], list[str]]:
+    """Run each scenario repeat times; its result line, (module, self us, cumulative us) imports of the best run, and the failures."""
+    results, imports_by_scenario, failures = [], [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        stdin_path = os.path.join(tmp, "input.hex")
+        with open(stdin_path, "w") as f:
+            f.writelines(f"aa55{i & 0xFF:02x}{i:08x}\n" for i in range(INPUT_ROWS))
+        out = os.path.join(tmp, "out")
+        run(None, stdin_path, out)  # writes the bytecode cache
+        for scenario in scenarios:
+            best = None
+            for _ in range(repeat):
+                seconds, imports = run(SCENARIOS[scenario], stdin_path, out)
+                import_seconds = sum(own for _, own, _ in imports) / 1e6
+                if best is None or import_seconds < best[1]:
+                    best = (seconds, import_seconds, imports)
+            seconds, import_seconds, imports = best
+            results.append({"scenario": scenario, "seconds": round(seconds, 6), "import_seconds": round(import_seconds, 6), "modules": len(imports)})
+            imports_by_scenario.append(imports)
+            loaded = {name for name, _, _ in imports}
+            for module, allowed in FORBIDDEN.items():
+                if module in loaded and scenario not in allowed:
+                    failures.append(f"{scenario}: imports {module}")
+            if budget and import_seconds * 1000 > budget:
+                failures.append(f"{scenario}: imports take {import_seconds * 1000:.1f} ms, over the {budget:g} ms budget")
+    return results, imports_by_scenario, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=5, help="runs per scenario, the best one counts [5]")
+    parser.add_argument("--budget", type=float, default=BUDGET_MS, metavar="MS",
+                        help=f"fail if a scenario's imports take longer than MS milliseconds, 0 for no limit [{BUDGET_MS:g}]")
+    parser.add_argument("--top", type=int, default=0, metavar="N", help="list the N slowest imports of each scenario on stderr")
+    parser.add_argument("--compare", metavar="JSONL", help="print each scenario's import time relative to this earlier run on stderr")
+    args = parser.parse_args()
+
+    results, imports_by_scenario, failures = measure(args.scenario, args.repeat, args.budget)
+    for result, imports in zip(results, imports_by_scenario):
+        print(json.dumps(result), flush=True)
+        for name, own, cumulative in sorted(imports, key=lambda i: -i[2])[:args.top]:
+            print(f"{result['scenario']:>8} {cumulative / 1000:8.1f} ms {own / 1000:8.1f} ms self  {name}", file=sys.stderr)
+    if args.compare:
+        compare(results, args.compare)
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
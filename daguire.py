@@ -1,25 +1,35 @@
 #! /usr/bin/env python3
+import os
 import sys
-import sqlite3
-import argparse
-import xml.sax.saxutils as saxutils
-import tkinter as tk
-from tkinter import ttk
-from tkinter.filedialog import asksaveasfilename
+import mmap
+import time
+import heapq
+import math
+from array import array
+from bisect import bisect_right
+from collections import Counter, OrderedDict, deque
+from itertools import chain, islice, repeat
+from contextlib import contextmanager, nullcontext
+
+# Value of the node that stands for every word outside a column's top K (multi-byte fields)
+OTHER = -1
+
 
 # Display format options for byte labels (used when drawing nodes)
-def format_byte_label(val: int | None, options: dict[str, bool]) -> str:
+def format_byte_label(val: int | None, options: dict[str, bool], width: int = 1) -> str:
     if val is None:
         return str(None)
+    if val == OTHER:
+        return "other"
     parts = []
     if options.get("decimal", True):
         parts.append(str(val))
     if options.get("hex", True):
-        parts.append(f"0x{val:02X}")
+        parts.append(f"0x{val:0{2 * width}X}")
     if options.get("binary", True):
         parts.append(f"{val:b}")
     if options.get("ascii", True):
-        parts.append(chr(val) if 0x20 <= val <= 0x7E else "·")
+        parts.append("".join(chr(b) if 0x20 <= b <= 0x7E else "·" for b in val.to_bytes(max(width, (val.bit_length() + 7) // 8), "big")))
     return "\n".join(parts) if parts else str(val)
 
 class Node:
@@ -35,8 +45,8 @@ class Node:
         self.coordinates = coordinates
 
     def getrepr(self, v):
-        if v == None:
-            return str(None)
+        if v is None or not 0 <= v <= 0xFF:
+            return format_byte_label(v, {})
         else:
             o = str(v) + "\n"
             o += f"0x{v:02X}\n"
@@ -45,7 +55,7 @@ class Node:
             return o
 
     def getcolor(self, v):
-        if v is None:
+        if v is None or v == OTHER:
             return "#2d2d3a"
         if v == 0xFF:
             return "#3d3d4a"
@@ -60,21 +70,661 @@ class Node:
         return "#4a9b6a"       # muted green
 
 
-class Dag:
-    def __init__(self, conn: sqlite3.Connection, fmt="hex", sz=8):
-        self.conn = conn
-        self.fmt = fmt
+# The byte classes that Node.getcolor colors alike: (first, last, name)
+BYTE_CLASSES = (
+    (0x00, 0x00, "0x00"),
+    (0x01, 0x1F, "control"),
+    (0x20, 0x7F, "printable"),
+    (0x80, 0xBF, "0x80-0xBF"),
+    (0xC0, 0xFE, "0xC0-0xFE"),
+    (0xFF, 0xFF, "0xFF"),
+)
+# First byte of the class of every byte value
+BYTE_CLASS_OF = bytes(first for first, last, _ in BYTE_CLASSES for _ in range(first, last + 1))
+BYTE_CLASS_NAMES = {first: name for first, _, name in BYTE_CLASSES}
+
+
+class IngestProgress:
+    """Periodic rows and rows/sec report on stderr while ingesting."""
+
+    def __init__(self, interval: float = 1.0, stream=None):
+        self.interval = interval
+        self.stream = stream if stream is not None else sys.stderr
+        self.rows = 0
+        self.start = time.perf_counter()
+        self.last_report = self.start
+
+    def update(self, n: int):
+        self.rows += n
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report(now, end="\r" if self.stream.isatty() else "\n")
+
+    def finish(self):
+        self.report(time.perf_counter(), end="\n")
+
+    def report(self, now: float, end: str):
+        elapsed = now - self.start
+        rate = self.rows / elapsed if elapsed > 0 else 0.0
+        print(f"Ingested {self.rows:,} rows in {elapsed:.1f}s ({rate:,.0f} rows/s)", end=end, file=self.stream, flush=True)
+
+
+class StageTimer:
+    """Wall time per named stage of a run; `with timer("ingest"): ...` adds to that stage."""
+
+    def __init__(self):
+        self.times = {}
+
+    @contextmanager
+    def __call__(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] = self.times.get(name, 0.0) + time.perf_counter() - start
+
+    def report(self, stream=None):
+        stream = stream if stream is not None else sys.stderr
+        for name, seconds in self.times.items():
+            print(f"{name:>16}: {seconds:9.3f}s", file=stream)
+
+
+class LiveFeed:
+    """Reads lines from a stream on a daemon thread, so a capture can be counted while it is still running.
+
+    At most MAX_PENDING lines wait to be taken; beyond that the reader blocks, leaving the
+    rest of a fast producer's output in the pipe instead of in memory.
+    """
+
+    MAX_PENDING = 1 << 16
+
+    def __init__(self, stream):
+        import queue
+        import threading
+        self.lines = queue.Queue(maxsize=self.MAX_PENDING)
+        self.done = False
+        self.thread = threading.Thread(target=self.run, args=(stream,), daemon=True)
+        self.thread.start()
+
+    def run(self, stream):
+        try:
+            for line in stream:
+                self.lines.put(line)
+        finally:
+            self.done = True
+
+    def take(self, limit: int) -> list[str]:
+        """Remove and return up to limit of the lines read so far."""
+        import queue
+        lines = []
+        try:
+            while len(lines) < limit:
+                lines.append(self.lines.get_nowait())
+        except queue.Empty:
+            pass
+        return lines
+
+    @property
+    def finished(self) -> bool:
+        """The stream hit EOF and every line has been taken."""
+        return self.done and self.lines.empty()
+
+
+# Histogram slot for offsets past the end of a sample (SQL NULL / None)
+NONE_BIN = 256
+NBINS = 257
+
+
+def pair_keys(src: bytes, dst: bytes) -> memoryview:
+    """View two equal-length byte columns as (src << 8 | dst) keys without a per-byte Python loop."""
+    buf = bytearray(2 * len(src))
+    if sys.byteorder == "little":
+        buf[0::2], buf[1::2] = dst, src
+    else:
+        buf[0::2], buf[1::2] = src, dst
+    return memoryview(buf).cast("H")
+
+
+def present_counts(lengths, sz: int) -> list[int]:
+    """present[o] = how many of the sample lengths extend past offset o."""
+    hist = Counter(lengths)
+    present = [0] * sz
+    running = sum(ct for length, ct in hist.items() if length > sz)
+    for o in range(sz - 1, -1, -1):
+        running += hist.get(o + 1, 0)
+        present[o] = running
+    return present
+
+
+def iter_bits(mask: int):
+    """Yield the value bins set in a bitset."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def value_bin(v: int | None) -> int:
+    return NONE_BIN if v is None else v
+
+
+def bin_value(b: int) -> int | None:
+    return None if b == NONE_BIN else b
+
+
+def edge_sort_key(edge: tuple) -> tuple:
+    """Order (src, dst, count) edges by value pair, None first, as SQL GROUP BY does."""
+    src, dst = edge[0], edge[1]
+    return (src is not None, src or 0, dst is not None, dst or 0)
+
+
+def uncount(counter: Counter, delta: Counter):
+    """Subtract delta from counter, dropping the keys whose count reaches zero."""
+    for key, ct in delta.items():
+        left = counter[key] - ct
+        if left:
+            counter[key] = left
+        else:
+            del counter[key]
+
+
+class HistogramIndex:
+    """Per-offset 257-bin value counts and sparse adjacent-offset transition counts.
+
+    Maintained incrementally as rows are ingested so that count and edge queries
+    never have to scan the records table.
+    """
+
+    def __init__(self, sz: int):
         self.sz = sz
-        self.colnames = None
-        self.valnames = None
-        self.initDb()
-        if self.fmt == 'hex':
-            self.read_lines()
+        self.counts = [[0] * NBINS for _ in range(sz)]
+        # transitions[o] counts (value at o) << 8 | (value at o + 1) for byte pairs;
+        # tails[o] counts values at o (NONE_BIN included) whose sample ends before o + 1
+        self.transitions = [Counter() for _ in range(max(sz - 1, 0))]
+        self.tails = [Counter() for _ in range(max(sz - 1, 0))]
+        self.rows = 0
+        # value_masks[o] is the bitset of the value bins seen at o; successor_masks[o][v] the
+        # bitset of the value bins that follow value bin v at o. Both change with the counts,
+        # so filtering never has to rebuild them from the transition counters
+        self.value_masks = [0] * sz
+        self.successor_masks = [[0] * NBINS for _ in range(max(sz - 1, 0))]
+        self.version = 0
+
+    def add_samples(self, samples: list[bytes]):
+        """Count samples of at most sz bytes; offsets past the end of a sample count as None."""
+        self.count_samples(samples, 1)
+
+    def remove_samples(self, samples: list[bytes]):
+        """Uncount samples that were added earlier, e.g. when they expire from a sliding window."""
+        self.count_samples(samples, -1)
+
+    def count_samples(self, samples: list[bytes], sign: int):
+        if not samples:
+            return
+        n, sz = len(samples), self.sz
+        # Longest samples first so every column is its byte values followed by padding
+        samples = sorted(samples, key=len, reverse=True)
+        matrix = b"".join(s.ljust(sz, b"\0") for s in samples)
+        present = present_counts(map(len, samples), sz)
+        columns = [matrix[o::sz][:present[o]] for o in range(sz)]
+        for o, (counts, values) in enumerate(zip(self.counts, columns)):
+            delta = Counter(values)
+            if len(values) < n:
+                delta[NONE_BIN] = n - len(values)
+            mask = self.value_masks[o]
+            for v, ct in delta.items():
+                counts[v] += sign * ct
+                if counts[v]:
+                    mask |= 1 << v
+                else:
+                    mask &= ~(1 << v)
+            self.value_masks[o] = mask
+        for transitions, tails, succ, src, dst in zip(self.transitions, self.tails, self.successor_masks, columns, columns[1:]):
+            ended = Counter(src[len(dst):])
+            if len(src) < n:
+                ended[NONE_BIN] = n - len(src)
+            keys = pair_keys(src[:len(dst)], dst)
+            if sign > 0:
+                # Only pairs seen for the first time add successor bits
+                for k in set(keys).difference(transitions):
+                    succ[k >> 8] |= 1 << (k & 0xFF)
+                for v in ended.keys() - tails.keys():
+                    succ[v] |= 1 << NONE_BIN
+                transitions.update(keys)
+                tails.update(ended)
+            else:
+                pairs = Counter(keys)
+                uncount(transitions, pairs)
+                uncount(tails, ended)
+                for k in pairs:
+                    if k not in transitions:
+                        succ[k >> 8] &= ~(1 << (k & 0xFF))
+                for v in ended:
+                    if v not in tails:
+                        succ[v] &= ~(1 << NONE_BIN)
+        self.rows += sign * n
+        self.invalidate()
+
+    def merge(self, other: "HistogramIndex"):
+        """Add another index's counts over the same offsets into this one."""
+        for counts, other_counts in zip(self.counts, other.counts):
+            for v, ct in enumerate(other_counts):
+                counts[v] += ct
+        for transitions, other_transitions in zip(self.transitions, other.transitions):
+            transitions.update(other_transitions)
+        for tails, other_tails in zip(self.tails, other.tails):
+            tails.update(other_tails)
+        self.value_masks = [mask | other_mask for mask, other_mask in zip(self.value_masks, other.value_masks)]
+        for succ, other_succ in zip(self.successor_masks, other.successor_masks):
+            for v, mask in enumerate(other_succ):
+                if mask:
+                    succ[v] |= mask
+        self.rows += other.rows
+        self.invalidate()
+
+    def invalidate(self):
+        self.version += 1
+
+    def to_bin(self, o: int, v: int | None) -> int | None:
+        return value_bin(v)
+
+    def from_bin(self, o: int, b: int) -> int | None:
+        return bin_value(b)
+
+    def value_mask(self, o: int) -> int:
+        """Bitset of the value bins seen at offset o."""
+        return self.value_masks[o]
+
+    def successors(self, o: int) -> list[int]:
+        """successors(o)[v] is the bitset of value bins that follow value bin v at offset o."""
+        return self.successor_masks[o]
+
+    def step(self, o: int, mask: int) -> int:
+        """Bitset of the value bins at o + 1 reachable from the value bins in mask at o."""
+        succ = self.successors(o)
+        out = 0
+        for v in iter_bits(mask):
+            out |= succ[v]
+        return out
+
+    def val_counts(self, o: int) -> list[tuple[int | None, int]]:
+        """(value, count) pairs at offset o, least frequent first."""
+        counts = self.counts[o]
+        res = [(None, counts[NONE_BIN])] if counts[NONE_BIN] else []
+        res += [(v, ct) for v, ct in enumerate(counts[:NONE_BIN]) if ct]
+        res.sort(key=lambda r: r[1])
+        return res
+
+    def edge_counts(self, o: int) -> list[tuple[int | None, int | None, int]]:
+        """(value at o, value at o + 1, count) triples, ordered by value pair."""
+        res = [(k >> 8, k & 0xFF, ct) for k, ct in self.transitions[o].items() if ct]
+        res += [(None if v == NONE_BIN else v, None, ct) for v, ct in self.tails[o].items() if ct]
+        res.sort(key=edge_sort_key)
+        return res
+
+    def edge_count_values(self, o: int):
+        """The counts of edge_counts(o), in no particular order, without building the triples."""
+        return chain(self.transitions[o].values(), self.tails[o].values())
+
+
+def prune_summary(counter: Counter, capacity: int):
+    """Shrink counter to at most capacity keys the Misra-Gries way.
+
+    Every count drops by the (capacity + 1)-th largest one and keys left at zero
+    go, so a key's count is low by at most total / (capacity + 1).
+    """
+    if len(counter) <= capacity:
+        return
+    cut = heapq.nlargest(capacity + 1, counter.values())[-1]
+    for key, ct in list(counter.items()):
+        if ct > cut:
+            counter[key] = ct - cut
         else:
-            self.read_files()
+            del counter[key]
+
+
+def word_typecode(width: int) -> str:
+    return next(t for t in "BHILQ" if array(t).itemsize == width)
+
+
+class WordIndex:
+    """Per-offset counts of width-byte words, in memory bounded by the capacity.
+
+    Values, transitions and tails of each offset are Misra-Gries summaries, so only
+    frequent words are counted individually; the rest of a column is the OTHER node,
+    keeping column totals exact. Bins for the filter bitsets are assigned per offset
+    in val_counts order. Offers the HistogramIndex query interface.
+    """
+
+    # Transition summaries hold this many times the value capacity
+    PAIR_FACTOR = 4
+
+    def __init__(self, sz: int, width: int, byteorder: str = "big", capacity: int = 64):
+        self.sz = sz
+        self.width = width
+        self.byteorder = byteorder
+        self.capacity = capacity
+        self.typecode = word_typecode(width)
+        self.pair_typecode = word_typecode(2 * width)
+        self.values = [Counter() for _ in range(sz)]
+        self.present = [0] * sz  # samples with a whole word at the offset
+        self.transitions = [Counter() for _ in range(max(sz - 1, 0))]
+        self.tails = [Counter() for _ in range(max(sz - 1, 0))]
+        self.rows = 0
+        self._bins = {}
+        self._successors = {}
+        self._edges = {}
+        self.version = 0
+
+    def pair_keys(self, src: array, dst: array) -> memoryview:
+        """(src << 8 * width | dst) keys of two equal-length word columns."""
+        keys = array(self.typecode, bytes(2 * len(src) * self.width))
+        if sys.byteorder == "little":
+            keys[0::2], keys[1::2] = dst, src
+        else:
+            keys[0::2], keys[1::2] = src, dst
+        return memoryview(keys).cast("B").cast(self.pair_typecode)
+
+    def add_samples(self, samples: list[bytes]):
+        """Count samples of at most sz words; a trailing partial word counts as None."""
+        if not samples:
+            return
+        n, sz, width = len(samples), self.sz, self.width
+        samples = sorted(samples, key=len, reverse=True)
+        words = array(self.typecode, b"".join(s.ljust(sz * width, b"\0") for s in samples))
+        if self.byteorder != sys.byteorder:
+            words.byteswap()
+        present = present_counts((len(s) // width for s in samples), sz)
+        columns = [words[o::sz][:present[o]] for o in range(sz)]
+        for o, values in enumerate(columns):
+            self.present[o] += len(values)
+            self.values[o].update(values)
+            prune_summary(self.values[o], self.capacity)
+        for transitions, tails, src, dst in zip(self.transitions, self.tails, columns, columns[1:]):
+            transitions.update(self.pair_keys(src[:len(dst)], dst))
+            prune_summary(transitions, self.capacity * self.PAIR_FACTOR)
+            tails.update(src[len(dst):])
+            prune_summary(tails, self.capacity)
+        self.rows += n
+        self.invalidate()
+
+    def merge(self, other: "WordIndex"):
+        for o in range(self.sz):
+            self.present[o] += other.present[o]
+            self.values[o].update(other.values[o])
+            prune_summary(self.values[o], self.capacity)
+        for transitions, other_transitions in zip(self.transitions, other.transitions):
+            transitions.update(other_transitions)
+            prune_summary(transitions, self.capacity * self.PAIR_FACTOR)
+        for tails, other_tails in zip(self.tails, other.tails):
+            tails.update(other_tails)
+            prune_summary(tails, self.capacity)
+        self.rows += other.rows
+        self.invalidate()
+
+    def invalidate(self):
+        self.version += 1
+        self._bins.clear()
+        self._successors.clear()
+        self._edges.clear()
+
+    def bins(self, o: int) -> tuple[list, dict]:
+        """The values of offset o in bin order, and the bin of each value."""
+        bins = self._bins.get(o)
+        if bins is None:
+            values = [v for v, _ in self.val_counts(o)]
+            bins = self._bins[o] = (values, {v: b for b, v in enumerate(values)})
+        return bins
+
+    def to_bin(self, o: int, v: int | None) -> int | None:
+        return self.bins(o)[1].get(v)
+
+    def from_bin(self, o: int, b: int) -> int | None:
+        return self.bins(o)[0][b]
+
+    def value_mask(self, o: int) -> int:
+        return (1 << len(self.bins(o)[0])) - 1
+
+    def successors(self, o: int) -> list[int]:
+        succ = self._successors.get(o)
+        if succ is None:
+            src_bins, dst_bins = self.bins(o)[1], self.bins(o + 1)[1]
+            succ = [0] * len(src_bins)
+            for src, dst, _ in self.edge_counts(o):
+                succ[src_bins[src]] |= 1 << dst_bins[dst]
+            self._successors[o] = succ
+        return succ
+
+    def step(self, o: int, mask: int) -> int:
+        succ = self.successors(o)
+        out = 0
+        for b in iter_bits(mask):
+            out |= succ[b]
+        return out
+
+    def val_counts(self, o: int) -> list[tuple[int | None, int]]:
+        """(value, count) pairs at offset o, least frequent first; OTHER holds the words not tracked."""
+        kept = self.values[o]
+        res = [(None, self.rows - self.present[o])] if self.rows > self.present[o] else []
+        other = self.present[o] - sum(kept.values())
+        if other:
+            res.append((OTHER, other))
+        res += sorted(kept.items())
+        res.sort(key=lambda r: r[1])
+        return res
+
+    def edge_counts(self, o: int) -> list[tuple[int | None, int | None, int]]:
+        """(value at o, value at o + 1, count) triples, ordered by value pair; untracked words are OTHER.
+
+        The summaries are pruned separately, so tracked transitions, largest first, only
+        take what their two nodes have left; the rest of each node's count then flows
+        to or from OTHER where possible, else wherever it fits. Every node's in-edges
+        and out-edges add up to its count.
+        """
+        edges = self._edges.get(o)
+        if edges is None:
+            edges = self._edges[o] = self.allocate_edges(o)
+        return edges
+
+    def allocate_edges(self, o: int) -> list[tuple[int | None, int | None, int]]:
+        src_kept, dst_kept = self.values[o], self.values[o + 1]
+        shift = 8 * self.width
+        mask = (1 << shift) - 1
+        tracked = Counter()
+        for key, ct in self.transitions[o].items():
+            src, dst = key >> shift, key & mask
+            tracked[src if src in src_kept else OTHER, dst if dst in dst_kept else OTHER] += ct
+        for src, ct in self.tails[o].items():
+            tracked[src if src in src_kept else OTHER, None] += ct
+        # What each node at o sends and each node at o + 1 receives; None at o + 1 receives the
+        # samples ending there, the ones that ended earlier are its edge from None at o
+        supply = {v: ct for v, ct in self.val_counts(o) if v is not None}
+        demand = {v: ct for v, ct in self.val_counts(o + 1) if v is not None}
+        demand[None] = self.present[o] - self.present[o + 1]
+        edges = Counter()
+
+        def flow(src, dst, ct):
+            ct = min(ct, supply.get(src, 0), demand.get(dst, 0))
+            if ct > 0:
+                edges[src, dst] += ct
+                supply[src] -= ct
+                demand[dst] -= ct
+
+        for (src, dst), ct in sorted(tracked.items(), key=lambda e: (-e[1], edge_sort_key(e[0]))):
+            flow(src, dst, ct)
+        srcs = sorted(v for v in supply if v != OTHER)
+        dsts = sorted((v for v in demand if v != OTHER), key=lambda v: (v is not None, v or 0))
+        for src in srcs:
+            flow(src, OTHER, supply[src])
+        for dst in dsts:
+            flow(OTHER, dst, demand[dst])
+        # Whatever is left pairs up in one sweep, each side moving on once its entry is used up
+        srcs = [v for v in [OTHER] + srcs if supply.get(v, 0) > 0]
+        dsts = [v for v in [OTHER] + dsts if demand.get(v, 0) > 0]
+        i = j = 0
+        while i < len(srcs) and j < len(dsts):
+            flow(srcs[i], dsts[j], supply[srcs[i]])
+            if not supply[srcs[i]]:
+                i += 1
+            if not demand[dsts[j]]:
+                j += 1
+        ended = self.rows - self.present[o]
+        if ended:
+            edges[None, None] += ended
+        res = [(src, dst, ct) for (src, dst), ct in edges.items()]
+        res.sort(key=edge_sort_key)
+        return res
+
+    def edge_count_values(self, o: int):
+        """The counts of edge_counts(o); the summaries are small, so this just builds them."""
+        return (ct for _, _, ct in self.edge_counts(o))
+
+
+# Rows per RowBitmap chunk, and the most rows a chunk keeps as an array rather than a bitset
+ROW_CHUNK = 1 << 16
+ROW_ARRAY_MAX = 4096
+
+
+def chunk_bits(chunk) -> int:
+    """A RowBitmap chunk as a ROW_CHUNK-bit int."""
+    if isinstance(chunk, int):
+        return chunk
+    bits = bytearray(ROW_CHUNK // 8)
+    for low in chunk:
+        bits[low >> 3] |= 1 << (low & 7)
+    return int.from_bytes(bits, "little")
+
+
+def chunk_rows(chunk) -> array:
+    """A RowBitmap chunk as the sorted array('H') of its low row bits."""
+    if not isinstance(chunk, int):
+        return chunk
+    bits = chunk.to_bytes(ROW_CHUNK // 8, "little")
+    return array("H", (i << 3 | k for i, byte in enumerate(bits) if byte for k in range(8) if byte >> k & 1))
+
+
+def chunk_len(chunk) -> int:
+    return chunk.bit_count() if isinstance(chunk, int) else len(chunk)
+
+
+def compact_chunk(chunk):
+    """Store a chunk the smaller way: up to ROW_ARRAY_MAX rows as an array, more as a bitset."""
+    if chunk_len(chunk) > ROW_ARRAY_MAX:
+        return chunk_bits(chunk)
+    return chunk_rows(chunk)
+
+
+class RowBitmap:
+    """Set of row numbers, compressed the way roaring bitmaps are.
+
+    Rows are grouped into chunks of ROW_CHUNK by their high bits; a chunk of at most
+    ROW_ARRAY_MAX rows keeps their low bits as a sorted array('H'), a fuller one a
+    bitset int. Intersections only visit the chunks both sides have, and cost about
+    the size of the smaller chunk.
+    """
+
+    def __init__(self, chunks=None):
+        self.chunks = chunks if chunks is not None else {}  # row >> 16 -> array('H') or int
+
+    def __len__(self):
+        return sum(map(chunk_len, self.chunks.values()))
+
+    def __bool__(self):
+        return bool(self.chunks)
+
+    def __iter__(self):
+        for high in sorted(self.chunks):
+            base = high * ROW_CHUNK
+            for low in chunk_rows(self.chunks[high]):
+                yield base + low
+
+    def __and__(self, other: "RowBitmap") -> "RowBitmap":
+        chunks = {}
+        for high in self.chunks.keys() & other.chunks.keys():
+            a, b = self.chunks[high], other.chunks[high]
+            if isinstance(a, int) and isinstance(b, int):
+                both = compact_chunk(a & b)
+            elif isinstance(a, int) or isinstance(b, int):
+                rows, bits = (b, a.to_bytes(ROW_CHUNK // 8, "little")) if isinstance(a, int) else (a, b.to_bytes(ROW_CHUNK // 8, "little"))
+                both = array("H", (low for low in rows if bits[low >> 3] >> (low & 7) & 1))
+            else:
+                both = array("H", sorted(set(a).intersection(b)))
+            if chunk_len(both):
+                chunks[high] = both
+        return RowBitmap(chunks)
+
+    def __or__(self, other: "RowBitmap") -> "RowBitmap":
+        chunks = dict(self.chunks)
+        for high, b in other.chunks.items():
+            a = chunks.get(high)
+            if a is None:
+                chunks[high] = b
+            elif isinstance(a, int) or isinstance(b, int) or len(a) + len(b) > ROW_ARRAY_MAX:
+                chunks[high] = compact_chunk(chunk_bits(a) | chunk_bits(b))
+            else:
+                chunks[high] = array("H", sorted(set(a).union(b)))
+        return RowBitmap(chunks)
+
+
+def column_bitmaps(column) -> dict:
+    """RowBitmap of the rows holding each value of a column (None included)."""
+    bitmaps = {}
+    for high, start in enumerate(range(0, len(column), ROW_CHUNK)):
+        lows = {}
+        for low, v in enumerate(column[start:start + ROW_CHUNK]):
+            rows = lows.get(v)
+            if rows is None:
+                rows = lows[v] = array("H")
+            rows.append(low)
+        for v, rows in lows.items():
+            bitmap = bitmaps.get(v)
+            if bitmap is None:
+                bitmap = bitmaps[v] = RowBitmap()
+            bitmap.chunks[high] = compact_chunk(rows)
+    return bitmaps
+
+
+class SqliteRecords:
+    """Row store with one INTEGER column per offset in an SQLite table (NULL past a sample's end)."""
+
+    # SQLite's default SQLITE_MAX_COLUMN is 2000, one of which is the id
+    MAX_SZ = 1999
+    # The records table is a scratch in-memory matrix: no durability is needed while bulk loading,
+    # but the rollback journal stays (in memory) so that transaction() can undo a failed batch
+    BULK_PRAGMAS = (
+        "PRAGMA journal_mode = MEMORY",
+        "PRAGMA synchronous = OFF",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA cache_size = -65536",
+    )
+    # Ids per select query, within SQLite's oldest SQLITE_MAX_VARIABLE_NUMBER default of 999
+    SELECT_BATCH = 999
+
+    def __init__(self, conn, sz: int):
+        self._conn = conn  # an sqlite3 connection, or None for an in-memory database opened on first use
+        self.sz = sz
+        self.colnames = "(" + ",".join(f"off_{i}" for i in range(0, self.sz)) + ")"
+        self.valnames = "(" + ",".join("?" * self.sz) + ")"
+        self.insert_query = f"INSERT INTO records {self.colnames} VALUES {self.valnames};"
+        self._padding = (None,) * self.sz
+        self._schema = False
+
+    @property
+    def conn(self):
+        """The connection, with the records table created on first use rather than before any input."""
+        if not self._schema:
+            if self._conn is None:
+                import sqlite3
+                self._conn = sqlite3.connect(":memory:")
+            self.initDb()
+            self._schema = True
+        return self._conn
 
     def initDb(self):
-        cur = self.conn.cursor()
+        cur = self._conn.cursor()
+        for pragma in self.BULK_PRAGMAS:
+            cur.execute(pragma)
         q = """CREATE TABLE IF NOT EXISTS "records" (
         "id"	INTEGER,
         """
@@ -84,555 +734,2018 @@ class Dag:
                         );
         """
         cur.execute(q)
-        col_names = "("
-        for i in range(0, self.sz):
-            col_names += f"off_{i},"
-        col_names = col_names[:-1]
-        col_names += ")"
-        self.colnames = col_names
-        val_names = "("
-        for i in range(0, self.sz):
-            val_names += f"?,"
-        val_names = val_names[:-1]
-        val_names += ")"
-        self.valnames = val_names
+
+    def to_row(self, sample: bytes) -> tuple:
+        """Pad a sample to exactly sz values, None marking bytes past its end."""
+        row = tuple(sample)
+        if len(row) < self.sz:
+            row += self._padding[len(row):]
+        return row
+
+    @contextmanager
+    def transaction(self):
+        self.conn.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+
+    def append(self, samples: list[bytes]):
+        self.conn.executemany(self.insert_query, map(self.to_row, samples))
+
+    def __len__(self):
+        return self.conn.execute("SELECT count(*) FROM records").fetchone()[0]
+
+    def column(self, o: int, start: int = 0) -> list[int | None]:
+        """Values at offset o of the rows from row start on, in arrival order."""
+        return [v for (v,) in self.conn.execute(f"SELECT off_{o} FROM records ORDER BY id LIMIT -1 OFFSET ?", (start,))]
+
+    def recent_columns(self, n: int) -> list:
+        """Values at each offset of the last n rows, in arrival order, read in one range query on the id."""
+        rows = self.conn.execute(f"SELECT {self.colnames[1:-1]} FROM records WHERE id > (SELECT max(id) FROM records) - ? ORDER BY id", (n,)).fetchall()
+        return list(zip(*rows)) if rows else [()] * self.sz
+
+    def select(self, rows) -> list[bytes]:
+        """The stored samples at the given row positions, in row order, looked up by id (row + 1) in batches."""
+        ids = sorted(r + 1 for r in rows)
+        out = []
+        for start in range(0, len(ids), self.SELECT_BATCH):
+            batch = ids[start:start + self.SELECT_BATCH]
+            cur = self.conn.execute(f"SELECT {self.colnames[1:-1]} FROM records WHERE id IN ({','.join('?' * len(batch))}) ORDER BY id", batch)
+            out.extend(bytes(v for v in row if v is not None) for row in cur)
+        return out
+
+    def save(self, path: str):
+        import sqlite3
+        dst = sqlite3.connect(path)
+        try:
+            self.conn.backup(dst)
+        finally:
+            dst.close()
+
+    def load(self, path: str):
+        import sqlite3
+        src = sqlite3.connect(path)
+        try:
+            src.backup(self.conn)
+        finally:
+            src.close()
+
+
+class ArrayRecords:
+    """Compact columnar row store: a fixed-stride uint8 matrix plus each row's sample length.
+
+    The length is the validity mask for the None padding, so a row costs sz + 4 bytes
+    and there is no column limit.
+    """
+
+    MAX_SZ = None
+
+    def __init__(self, conn, sz: int):
+        self.sz = sz
+        self.matrix = bytearray()
+        self.lengths = array("I")
+
+    @contextmanager
+    def transaction(self):
+        yield
+
+    def append(self, samples: list[bytes]):
+        self.lengths.extend(map(len, samples))
+        self.matrix += b"".join(s.ljust(self.sz, b"\0") for s in samples)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def column(self, o: int, start: int = 0) -> list[int | None]:
+        return [v if n > o else None for v, n in zip(self.matrix[start * self.sz + o::self.sz], self.lengths[start:])]
+
+    def recent_columns(self, n: int) -> list:
+        start = max(len(self) - n, 0)
+        return [self.column(o, start) for o in range(self.sz)]
+
+    def select(self, rows) -> list[bytes]:
+        sz, matrix, lengths = self.sz, self.matrix, self.lengths
+        return [matrix[r * sz:r * sz + lengths[r]] for r in sorted(rows)]
+
+    def save(self, path: str):
+        import pickle
+        with open(path, "wb") as f:
+            pickle.dump((self.lengths, self.matrix), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, path: str):
+        import pickle
+        with open(path, "rb") as f:
+            self.lengths, self.matrix = pickle.load(f)
+
+
+class SlidingWindowRecords:
+    """The last `limit` samples; older ones expire as new ones are admitted."""
+
+    MAX_SZ = None
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.samples = deque()
+
+    @contextmanager
+    def transaction(self):
+        yield
+
+    def admit(self, samples: list[bytes]) -> tuple[list[bytes], list[bytes]]:
+        """Keep samples; returns (the samples kept, the samples that expired)."""
+        self.samples.extend(samples)
+        popleft = self.samples.popleft
+        expired = [popleft() for _ in range(len(self.samples) - self.limit)]
+        return samples, expired
+
+    def __len__(self):
+        return len(self.samples)
+
+    def column(self, o: int, start: int = 0) -> list[int | None]:
+        return [s[o] if len(s) > o else None for s in islice(self.samples, start, None)]
+
+    def recent_columns(self, n: int) -> list:
+        recent = list(islice(self.samples, max(len(self.samples) - n, 0), None))
+        return [[s[o] if len(s) > o else None for s in recent] for o in range(max(map(len, recent), default=0))]
+
+    def select(self, rows) -> list[bytes]:
+        stored = list(self.samples)
+        return [stored[r] for r in sorted(rows)]
+
+    def save(self, path: str):
+        import pickle
+        with open(path, "wb") as f:
+            pickle.dump(self.samples, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, path: str):
+        import pickle
+        with open(path, "rb") as f:
+            self.samples = pickle.load(f)
+
+
+class ReservoirRecords(SlidingWindowRecords):
+    """A uniform random sample of `limit` of all the samples admitted so far.
+
+    Uses Li's Algorithm L, which draws how many samples to skip before the next
+    replacement instead of a random number per sample.
+    """
+
+    def __init__(self, limit: int, seed=None):
+        import random
+        self.limit = limit
+        self.samples = []
+        self.seen = 0
+        self.random = random.Random(seed)
+        self.w = math.exp(math.log(self.uniform()) / limit)
+        self.next = limit - 1 + self.skip()  # position of the next sample to take once full
+
+    def uniform(self) -> float:
+        u = 0.0
+        while not u:
+            u = self.random.random()
+        return u
+
+    def skip(self) -> int:
+        return int(math.log(self.uniform()) / math.log1p(-self.w)) + 1
+
+    def admit(self, samples: list[bytes]) -> tuple[list[bytes], list[bytes]]:
+        start = self.seen
+        self.seen += len(samples)
+        kept = samples[:max(self.limit - len(self.samples), 0)]
+        self.samples.extend(kept)
+        kept, expired = list(kept), []
+        while self.next < self.seen:
+            sample = samples[self.next - start]
+            slot = self.random.randrange(self.limit)
+            expired.append(self.samples[slot])
+            self.samples[slot] = sample
+            kept.append(sample)
+            self.w *= math.exp(math.log(self.uniform()) / self.limit)
+            self.next += self.skip()
+        return kept, expired
+
+    def save(self, path: str):
+        import pickle
+        with open(path, "wb") as f:
+            pickle.dump((self.samples, self.seen, self.w, self.next, self.random.getstate()), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, path: str):
+        import pickle
+        with open(path, "rb") as f:
+            self.samples, self.seen, self.w, self.next, state = pickle.load(f)
+        self.random.setstate(state)
+
+
+# Bounded alternatives to storing every sample; the index then counts only the kept ones
+INGEST_POLICIES = {"window": SlidingWindowRecords, "reservoir": ReservoirRecords}
+
+# "none" keeps only the histogram index: enough to draw and filter the DAG without the samples
+STORAGE_BACKENDS = {"sqlite": SqliteRecords, "array": ArrayRecords, "none": None}
+
+
+class Aligner:
+    """Finds where the graphed window of a sample starts.
+
+    That is the first match of any of the anchors (literal byte strings and/or a
+    bytes regex, searched in one pass), then past a header whose length is the
+    big-endian integer of `width` bytes `at` bytes into it. Samples without a match
+    have no start.
+    """
+
+    def __init__(self, anchors=(), regex: str | None = None, header_length: tuple[int, int] | None = None):
+        import re
+        self.spec = (tuple(anchors), regex, header_length)
+        patterns = [re.escape(a) for a in anchors] + ([regex.encode("latin-1")] if regex else [])
+        # A single literal is fastest with bytes.find; anything else becomes one alternation
+        self.literal = anchors[0] if len(patterns) == 1 and anchors else None
+        self.pattern = re.compile(b"|".join(b"(?:%s)" % p for p in patterns)) if patterns and self.literal is None else None
+        self.header_length = header_length
+
+    def start(self, data) -> int | None:
+        pos = 0
+        if self.literal is not None:
+            pos = data.find(self.literal)
+            if pos < 0:
+                return None
+        elif self.pattern is not None:
+            match = self.pattern.search(data)
+            if match is None:
+                return None
+            pos = match.start()
+        if self.header_length is not None:
+            at, width = self.header_length
+            field = data[pos + at:pos + at + width]
+            if len(field) < width:
+                return None
+            pos += int.from_bytes(field, "big")
+        return pos
+
+
+class LengthPrefixedFramer:
+    """Frames a stream of records that each start with their length, a width-byte integer."""
+
+    def __init__(self, width: int = 4, byteorder: str = "big"):
+        self.width = width
+        self.byteorder = byteorder
+
+    def frame(self, view: memoryview, pos: int):
+        head = pos + self.width
+        if head > len(view):
+            return None
+        end = head + int.from_bytes(view[pos:head], self.byteorder)
+        if end > len(view):
+            return None
+        return (head, end, 0), end
+
+
+PCAPNG_SECTION = b"\x0a\x0d\x0d\x0a"
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": "little", b"\x4d\x3c\xb2\xa1": "little",  # microsecond, nanosecond timestamps
+    b"\xa1\xb2\xc3\xd4": "big", b"\xa1\xb2\x3c\x4d": "big",
+}
+
+
+class PcapFramer:
+    """Frames the packets of a classic pcap or a pcapng capture, told apart by their first bytes.
+
+    Each packet's span carries the link type of its interface, for transport_payload.
+    """
+
+    def __init__(self):
+        self.ng = None
+        self.byteorder = "little"
+        self.linktypes = []
+
+    def u32(self, view: memoryview, pos: int) -> int:
+        return int.from_bytes(view[pos:pos + 4], self.byteorder)
+
+    def frame(self, view: memoryview, pos: int):
+        if self.ng is None:
+            if len(view) - pos < 24:
+                return None
+            magic = bytes(view[pos:pos + 4])
+            if magic != PCAPNG_SECTION:
+                if magic not in PCAP_MAGIC:
+                    raise ValueError("input is neither a pcap nor a pcapng capture")
+                self.ng, self.byteorder = False, PCAP_MAGIC[magic]
+                self.linktypes = [self.u32(view, pos + 20) & 0xFFFF]
+                return None, pos + 24
+            self.ng = True
+        if not self.ng:
+            if len(view) - pos < 16:
+                return None
+            end = pos + 16 + self.u32(view, pos + 8)
+            if end > len(view):
+                return None
+            return (pos + 16, end, self.linktypes[0]), end
+        if len(view) - pos < 12:
+            return None
+        if view[pos:pos + 4] == PCAPNG_SECTION:
+            # Each section sets its byte order and numbers its interfaces anew
+            self.byteorder = "little" if view[pos + 8:pos + 12] == b"\x4d\x3c\x2b\x1a" else "big"
+            self.linktypes = []
+        length = self.u32(view, pos + 4)
+        if length < 12:
+            raise ValueError(f"corrupt pcapng block of {length} bytes")
+        end = pos + length
+        if end > len(view):
+            return None
+        block_type = self.u32(view, pos)
+        if block_type == 1:  # interface description
+            self.linktypes.append(int.from_bytes(view[pos + 8:pos + 10], self.byteorder))
+        elif block_type == 6:  # enhanced packet
+            start = pos + 28
+            return (start, start + self.u32(view, pos + 20), self.linktype(self.u32(view, pos + 8))), end
+        elif block_type == 3:  # simple packet
+            start = pos + 12
+            return (start, start + min(self.u32(view, pos + 8), end - 4 - start), self.linktype(0)), end
+        return None, end
+
+    def linktype(self, interface: int) -> int:
+        if interface >= len(self.linktypes):
+            raise ValueError(f"packet of undescribed interface {interface}")
+        return self.linktypes[interface]
+
+
+def binary_blocks(stream, block_size: int, framer):
+    """Cut a binary stream into (buffer, spans) blocks of whole records, without copying them.
+
+    framer.frame(view, pos) returns the (start, stop, linktype) span of the record
+    at pos, or None for a block without one, together with where the next record
+    starts; or None if the record does not end within view yet.
+    """
+    rest = b""
+    while True:
+        chunk = stream.read(block_size)
+        buf = rest + chunk if rest else chunk
+        view = memoryview(buf)
+        pos, spans = 0, []
+        try:
+            while True:
+                framed = framer.frame(view, pos)
+                if framed is None:
+                    break
+                span, pos = framed
+                if span is not None:
+                    spans.append(span)
+        except ValueError as e:
+            print(f"Failure parsing: {e}", file=sys.stderr)
+            chunk = rest = b""
+        else:
+            rest = bytes(view[pos:])
+        if spans:
+            yield buf, spans
+        if not chunk:
+            if rest:
+                print(f"Ignoring {len(rest)} bytes of a truncated record at the end of the input", file=sys.stderr)
+            return
+
+
+LINKTYPE_ETHERNET, LINKTYPE_RAW, LINKTYPE_LINUX_SLL, LINKTYPE_IPV4, LINKTYPE_IPV6 = 1, 101, 113, 228, 229
+ETHERTYPE_IPV4, ETHERTYPE_IPV6 = 0x0800, 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8)
+IPV6_EXTENSIONS = (0, 43, 60)  # hop-by-hop, routing and destination options headers
+IPPROTO_TCP, IPPROTO_UDP, IPPROTO_FRAGMENT = 6, 17, 44
+
+
+def transport_payload(packet: memoryview, linktype: int) -> int | None:
+    """Offset of the TCP or UDP payload in a captured frame; None for anything else."""
+    try:
+        if linktype == LINKTYPE_ETHERNET:
+            pos, ethertype = 14, int.from_bytes(packet[12:14], "big")
+            while ethertype in ETHERTYPE_VLAN:
+                ethertype = int.from_bytes(packet[pos + 2:pos + 4], "big")
+                pos += 4
+        elif linktype == LINKTYPE_LINUX_SLL:
+            pos, ethertype = 16, int.from_bytes(packet[14:16], "big")
+        elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+            pos, ethertype = 0, {4: ETHERTYPE_IPV4, 6: ETHERTYPE_IPV6}.get(packet[0] >> 4)
+        else:
+            return None
+        if ethertype == ETHERTYPE_IPV4:
+            proto = packet[pos + 9]
+            pos += (packet[pos] & 0x0F) * 4
+        elif ethertype == ETHERTYPE_IPV6:
+            proto = packet[pos + 6]
+            pos += 40
+            while proto in IPV6_EXTENSIONS or proto == IPPROTO_FRAGMENT:
+                proto, pos = packet[pos], pos + (8 if proto == IPPROTO_FRAGMENT else (packet[pos + 1] + 1) * 8)
+        else:
+            return None
+        if proto == IPPROTO_TCP:
+            pos += (packet[pos + 12] >> 4) * 4
+        elif proto == IPPROTO_UDP:
+            pos += 8
+        else:
+            return None
+    except IndexError:
+        return None
+    return pos if pos <= len(packet) else None
+
+
+class SampleParser:
+    """Turns blocks of stdin input into samples of at most sz bytes.
+
+    Text blocks are lists of lines: hex strings ('hex'), base64 strings ('base64') or
+    paths of files to read ('file'). Binary blocks ('pcap', 'records') are a buffer
+    and the (start, stop, linktype) spans of its records, see binary_blocks. Failures
+    are returned rather than printed so that ingest workers can hand them back in order.
+    """
+
+    FORMATS = ("hex", "file", "base64", "pcap", "records")
+    BINARY_FORMATS = ("pcap", "records")
+
+    def __init__(self, fmt="hex", sz=8, offset=0, use_mmap=False, aligner: Aligner | None = None, payload=False):
+        self.fmt = fmt
+        self.sz = sz
+        self.offset = offset  # first byte of each sample to graph, after the aligner's start
+        self.use_mmap = use_mmap
+        self.aligner = aligner
+        self.payload = payload  # start each packet at its TCP/UDP payload
+
+    def __call__(self, block) -> tuple[list[bytes], list[str]]:
+        if self.fmt == 'hex':
+            samples, failures = self.parse_hex_lines(block)
+        elif self.fmt == 'base64':
+            samples, failures = self.parse_base64_lines(block)
+        elif self.fmt in self.BINARY_FORMATS:
+            samples, failures = self.parse_records(*block)
+        else:
+            samples, failures = self.parse_file_paths(block)
+        skipped = samples.count(None)
+        if skipped:
+            samples = [s for s in samples if s is not None]
+            reason = "an anchor match" if not self.payload else "a TCP/UDP payload" if self.aligner is None else "a TCP/UDP payload or anchor match"
+            failures.append(f"Skipped {skipped} samples without {reason}")
+        return samples, failures
+
+    def window(self, data) -> bytes | None:
+        """The sz bytes of data to graph, None if the aligner finds no start in it."""
+        start = self.offset
+        if self.aligner is not None:
+            pos = self.aligner.start(data)
+            if pos is None:
+                return None
+            start += pos
+        return data[start:start + self.sz]
+
+    def parse_hex_lines(self, lines) -> tuple[list[bytes | None], list[str]]:
+        samples, failures = [], []
+        window = self.window
+        for line in lines:
+            try:
+                samples.append(window(bytes.fromhex(line.strip())))
+            except ValueError:
+                failures.append(f"Failure parsing: {line.strip()}")
+        return samples, failures
+
+    def parse_base64_lines(self, lines) -> tuple[list[bytes | None], list[str]]:
+        from base64 import b64decode
+        samples, failures = [], []
+        window = self.window
+        for line in lines:
+            try:
+                # validate rejects characters outside the alphabet instead of skipping them
+                samples.append(window(b64decode(line.strip(), validate=True)))
+            except ValueError:
+                failures.append(f"Failure parsing: {line.strip()}")
+        return samples, failures
+
+    def parse_records(self, buf: bytes, spans) -> tuple[list[bytes | None], list[str]]:
+        """Slice each record's window out of buf, copying nothing else unless an aligner searches it."""
+        view = memoryview(buf)
+        samples = []
+        for start, stop, linktype in spans:
+            record = view[start:stop]
+            if self.payload:
+                pos = transport_payload(record, linktype)
+                if pos is None:
+                    samples.append(None)
+                    continue
+                record = record[pos:]
+            if self.aligner is not None:
+                record = record.tobytes()
+            sample = self.window(record)
+            samples.append(None if sample is None else bytes(sample))
+        return samples, []
+
+    def parse_file_paths(self, paths) -> tuple[list[bytes | None], list[str]]:
+        read = self.read_mapped_window if self.use_mmap else self.read_window
+        samples, failures = [], []
+        for path in paths:
+            try:
+                samples.append(read(path.strip()))
+            except Exception as e:
+                failures.append(f"Failure parsing: {path.strip()}, {e}")
+        return samples, failures
+
+    def read_window(self, path: str) -> bytes | None:
+        with open(path, 'rb') as f:
+            if self.aligner is not None:
+                return self.window(f.read())
+            f.seek(self.offset)
+            return f.read(self.sz)
+
+    def read_mapped_window(self, path: str) -> bytes | None:
+        """Read the window through a read-only mapping, touching only the pages searched or graphed."""
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0 or (self.aligner is None and size <= self.offset):
+                return self.window(b"")  # empty files cannot be mapped
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return self.window(mm)
+
+
+def ingest_worker(parser: SampleParser, index, keep_samples: bool, tasks, results):
+    """Parse (seq, lines) tasks until a None task, then send back the worker's partial index."""
+    for seq, lines in iter(tasks.get, None):
+        samples, failures = parser(lines)
+        index.add_samples(samples)
+        results.put(("block", seq, samples if keep_samples else None, len(samples), failures))
+    results.put(("index", index))
+
+
+class Dag:
+    # Bytes of input text parsed per block; samples of a block are stored and counted together
+    INGEST_BLOCK_SIZE = 1 << 20
+    # Bump whenever a change to HistogramIndex, WordIndex or a records class alters what
+    # gets pickled, so stale caches are ignored; load_cache also compares the index's
+    # attribute names with a fresh one's, catching an index change that missed the bump
+    CACHE_VERSION = 3
+    # Input kept in memory while hashing for the cache key before spilling to a temporary file
+    SPOOL_MAX_SIZE = 64 << 20
+    # Most lines counted per ingest_pending call, so a backlog cannot stall the UI for long
+    LIVE_MAX_LINES = 20000
+    # Kinds of offsets that the UI can collapse into narrow empty columns
+    COLLAPSIBLE = ("constant", "random")
+    # A counter stays or steps by one between this share of consecutive rows
+    COUNTER_STEPS = 0.95
+    # A random field has at least this share of the entropy its value range and row count allow
+    RANDOM_ENTROPY = 0.9
+    # Most recent rows checked for counters
+    ANALYSIS_ROWS = 1 << 12
+    # Clustering splits a group of samples at an offset only into at most this many
+    # values, which together hold at least this share of the group
+    CLUSTER_MAX_BRANCH = 32
+    CLUSTER_COVERAGE = 0.9
+
+    def __init__(self, conn, fmt="hex", sz=8, storage="sqlite", offset=0, use_mmap=False, jobs=1, cache_dir=None, live=False, policy=None, limit=0, aligner=None,
+                 width=1, byteorder="big", top=64, corpora=None, payload=False, record_prefix=(4, "big")):
+        self.init_settings(conn, fmt, sz, storage, offset, use_mmap, jobs, cache_dir, policy, limit, aligner, width, byteorder, top,
+                           [label for label, _ in corpora or ()], payload, record_prefix)
+        if corpora and (live or policy is not None):
+            raise ValueError("corpora are read from files, without an ingest policy")
+        if live and fmt in SampleParser.BINARY_FORMATS:
+            raise ValueError("binary input is not read live")
+        if live:
+            print("Reading data from STDIN as it arrives")
+            self.live = LiveFeed(sys.stdin)
+        elif corpora:
+            self.read_corpora(corpora)
+        elif self.fmt in ('hex', 'base64'):
+            self.read_lines()
+        elif self.fmt in SampleParser.BINARY_FORMATS:
+            self.read_binary()
+        else:
+            self.read_files()
+
+    def init_settings(self, conn, fmt, sz, storage, offset, use_mmap, jobs, cache_dir, policy, limit, aligner, width, byteorder, top,
+                      corpus_labels, payload, record_prefix):
+        """Set up the settings, storage, empty index and caches of a Dag that has read nothing yet."""
+        self.conn = conn
+        self.fmt = fmt
+        self.sz = sz  # offsets in the DAG, each a width-byte field
+        self.offset = offset
+        self.width = width
+        self.byteorder = byteorder
+        self.top = top
+        if width > 1 and (policy is not None or STORAGE_BACKENDS[storage] is not None):
+            raise ValueError("multi-byte fields are only counted, use storage 'none' without an ingest policy")
+        if width > 1 and jobs > 1:
+            # Workers would trim their own top-K summaries, and the merged result would depend on their order
+            raise ValueError("multi-byte fields are counted in a single process")
+        self.parser = SampleParser(fmt, sz * width, offset, use_mmap, aligner, payload)
+        self.record_prefix = record_prefix  # (width, byteorder) of the length of 'records' input
+        self.jobs = jobs
+        self.storage = storage
+        self.cache_dir = cache_dir
+        self.policy = policy
+        self.limit = limit
+        if policy is not None:
+            self.records = INGEST_POLICIES[policy](limit)
+        else:
+            backend = STORAGE_BACKENDS[storage]
+            self.records = backend(conn, sz) if backend else None
+        self.index = self.new_index()
+        # Labeled inputs read one after the other, each counted in its own index; with stored
+        # samples, sources[row] is the position of the row's corpus in corpus_labels
+        self.corpus_labels = corpus_labels
+        self.corpus_indexes = []
+        self.sources = array("H") if corpus_labels and self.records is not None else None
+        self.corpus = None
+        self._stats_key = self._stats = None
+        self._bitmaps_key, self._bitmaps = None, {}
+        self._match_key = self._match = None
+        self._clusters_key = self._clusters = None
+        self.live = None
+
+    def new_index(self):
+        if self.width == 1:
+            return HistogramIndex(self.sz)
+        return WordIndex(self.sz, self.width, self.byteorder, self.top)
+
+    def read_blocks(self, stream):
+        """Yield lists of lines from stream, INGEST_BLOCK_SIZE bytes at a time, or blocks of binary records."""
+        if self.fmt == 'pcap':
+            return binary_blocks(stream, self.INGEST_BLOCK_SIZE, PcapFramer())
+        if self.fmt == 'records':
+            return binary_blocks(stream, self.INGEST_BLOCK_SIZE, LengthPrefixedFramer(*self.record_prefix))
+        return iter(lambda: stream.readlines(self.INGEST_BLOCK_SIZE), [])
+
+    def parse_block(self, lines) -> list[bytes]:
+        samples, failures = self.parser(lines)
+        for failure in failures:
+            print(failure, file=sys.stderr)
+        return samples
+
+    def transaction(self):
+        return self.records.transaction() if self.records is not None else nullcontext()
+
+    def store(self, samples: list[bytes]):
+        self.records.append(samples)
+        if self.sources is not None:
+            self.sources.extend(repeat(self.corpus, len(samples)))
+
+    def add_samples(self, samples: list[bytes]):
+        if self.policy is not None:
+            # Count before uncounting: a sample may be admitted and expire in the same batch
+            samples, expired = self.records.admit(samples)
+            self.index.add_samples(samples)
+            self.index.remove_samples(expired)
+            return
+        if self.records is not None:
+            self.store(samples)
+        self.index.add_samples(samples)
+
+    def insert_samples(self, batches):
+        """Store and count batches of samples inside a single storage transaction."""
+        progress = IngestProgress()
+        with self.transaction():
+            for samples in batches:
+                self.add_samples(samples)
+                progress.update(len(samples))
+        progress.finish()
+
+    def ingest_pending(self) -> int:
+        """Store and count the lines the live feed read since the last call; returns the new sample count."""
+        lines = self.live.take(self.LIVE_MAX_LINES)
+        if not lines:
+            return 0
+        samples = self.parse_block(lines)
+        with self.transaction():
+            self.add_samples(samples)
+        return len(samples)
+
+    def insert_samples_parallel(self, blocks):
+        """Parse and count blocks in `jobs` worker processes, then merge their partial indexes.
+
+        Blocks are stored, and their failures reported, in input order, so the result is
+        identical to insert_samples over the same input.
+        """
+        import multiprocessing
+        import queue
+        ctx = multiprocessing.get_context()
+        tasks = ctx.Queue(maxsize=2 * self.jobs)
+        results = ctx.Queue()
+        workers = [
+            ctx.Process(target=ingest_worker, args=(self.parser, self.new_index(), self.records is not None, tasks, results), daemon=True)
+            for _ in range(self.jobs)
+        ]
+        for w in workers:
+            w.start()
+        progress = IngestProgress()
+        pending = {}
+        next_seq = 0
+        indexes = []
+
+        def handle(result):
+            nonlocal next_seq
+            if result[0] == "index":
+                indexes.append(result[1])
+                return
+            _, seq, samples, n, failures = result
+            pending[seq] = (samples, n, failures)
+            while next_seq in pending:
+                samples, n, failures = pending.pop(next_seq)
+                for failure in failures:
+                    print(failure, file=sys.stderr)
+                if samples is not None:
+                    self.store(samples)
+                progress.update(n)
+                next_seq += 1
+
+        def check_workers():
+            if any(w.exitcode not in (None, 0) for w in workers):
+                raise RuntimeError("ingest worker exited unexpectedly")
+
+        def put_task(task):
+            # The task queue is bounded: without live workers to drain it, a plain put never returns
+            while True:
+                try:
+                    return tasks.put(task, timeout=1.0)
+                except queue.Full:
+                    check_workers()
+
+        def wait_result():
+            while True:
+                try:
+                    return results.get(timeout=1.0)
+                except queue.Empty:
+                    check_workers()
+
+        with self.transaction():
+            for seq, lines in enumerate(blocks):
+                put_task((seq, lines))
+                while True:
+                    try:
+                        handle(results.get_nowait())
+                    except queue.Empty:
+                        break
+            for _ in workers:
+                put_task(None)
+            while len(indexes) < len(workers):
+                handle(wait_result())
+        for w in workers:
+            w.join()
+        for index in indexes:
+            self.index.merge(index)
+        progress.finish()
+
+    def ingest(self, stream):
+        blocks = self.read_blocks(stream)
+        if self.jobs > 1:
+            self.insert_samples_parallel(blocks)
+        else:
+            self.insert_samples(self.parse_block(block) for block in blocks)
+
+    def read_input(self, stream):
+        """Ingest stream, or load its analysis from cache_dir when this input was seen before."""
+        if self.cache_dir is None:
+            self.ingest(stream)
+            return
+        with self.keyed_input(stream) as (source, key):
+            base = os.path.join(self.cache_dir, key)
+            if self.load_cache(base):
+                print(f"Loaded cached analysis {key} ({self.index.rows:,} rows)", file=sys.stderr)
+                return
+            self.ingest(source)
+        self.save_cache(base)
+
+    @contextmanager
+    def keyed_input(self, stream):
+        """Hash stream together with the ingest settings; yields a stream to ingest and the digest.
+
+        A seekable stream, such as stdin redirected from a file, is hashed in place and
+        rewound, so a cache hit reads it once. A pipe is copied to a temporary spool
+        while it is hashed.
+        """
+        import hashlib
+        digest = hashlib.sha256(repr((self.CACHE_VERSION, self.fmt, self.sz, self.offset, self.storage, self.policy, self.limit, self.parser.aligner and self.parser.aligner.spec, self.width, self.byteorder, self.top,
+                                      self.parser.payload, self.record_prefix)).encode())
+        if stream.seekable():
+            start = stream.tell()
+            self.hash_input(stream, digest)
+            stream.seek(start)
+            yield stream, digest.hexdigest()
+            return
+        import tempfile
+        text = {} if self.fmt in SampleParser.BINARY_FORMATS else {"mode": "w+", "encoding": "utf-8"}
+        with tempfile.SpooledTemporaryFile(max_size=self.SPOOL_MAX_SIZE, **text) as spool:
+            self.hash_input(stream, digest, spool)
+            spool.seek(0)
+            yield spool, digest.hexdigest()
+
+    def hash_input(self, stream, digest, spool=None):
+        """Add what stream holds to digest, copying it to spool unless that is None.
+
+        For the file format the size and mtime of every listed file are hashed too, so
+        rewriting an image invalidates the cache even though its path is unchanged.
+        """
+        if self.fmt in SampleParser.BINARY_FORMATS:
+            for chunk in iter(lambda: stream.read(self.INGEST_BLOCK_SIZE), b""):
+                if spool is not None:
+                    spool.write(chunk)
+                digest.update(chunk)
+            return
+        for block in self.read_blocks(stream):
+            if spool is not None:
+                spool.writelines(block)
+            for line in block:
+                digest.update(line.encode("utf-8", "surrogateescape"))
+                if self.fmt == 'file':
+                    try:
+                        st = os.stat(line.strip())
+                        digest.update(f"\0{st.st_size}:{st.st_mtime_ns}\0".encode())
+                    except OSError:
+                        pass
+
+    def load_cache(self, base: str) -> bool:
+        import pickle
+        try:
+            with open(base + ".index", "rb") as f:
+                version, index = pickle.load(f)
+            if version != self.CACHE_VERSION:
+                return False
+            fresh = self.new_index()
+            if type(index) is not type(fresh) or vars(index).keys() != vars(fresh).keys():
+                return False
+            if self.records is not None:
+                self.records.load(base + ".records")
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"Ignoring unreadable cache {base}: {e}", file=sys.stderr)
+            return False
+        self.index = index
+        return True
+
+    def save_cache(self, base: str):
+        """Write records, then the index; the index file marks a complete entry."""
+        import pickle
+        os.makedirs(self.cache_dir, exist_ok=True)
+        try:
+            if self.records is not None:
+                self.records.save(base + ".records.tmp")
+                os.replace(base + ".records.tmp", base + ".records")
+            with open(base + ".index.tmp", "wb") as f:
+                pickle.dump((self.CACHE_VERSION, self.index), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(base + ".index.tmp", base + ".index")
+        except OSError as e:
+            print(f"Failed to write cache {base}: {e}", file=sys.stderr)
+
+    def read_corpora(self, corpora):
+        """Ingest each (label, path) input into its own index, then pool them into self.index."""
+        for i, (label, path) in enumerate(corpora):
+            print(f"Reading corpus {label} from {path}")
+            self.corpus, self.index = i, self.new_index()
+            binary = self.fmt in SampleParser.BINARY_FORMATS
+            with open(path, "rb") if binary else open(path, encoding="utf-8", errors="surrogateescape") as f:
+                self.ingest(f)
+            self.corpus_indexes.append(self.index)
+        self.corpus, self.index = None, self.new_index()
+        for index in self.corpus_indexes:
+            self.index.merge(index)
+
+    def corpus_counts(self, o: int) -> dict:
+        """Each value at offset o with its count in every corpus, in corpus order."""
+        counts = {}
+        for i, index in enumerate(self.corpus_indexes):
+            for v, ct in index.val_counts(o):
+                counts.setdefault(v, [0] * len(self.corpus_indexes))[i] = ct
+        return counts
 
     def read_lines(self):
         print("Reading data from STDIN")
-        cur = self.conn.cursor()
-        for line in sys.stdin:
-            try:
-                byte_line = list(bytearray.fromhex(line.strip()))[:self.sz]
-                if len(byte_line) < self.sz:
-                    byte_line.extend([None] * (self.sz - len(byte_line)))
-                iq = f"INSERT INTO records {self.colnames} VALUES {self.valnames};"
-                cur.execute(iq, byte_line)
-            except:
-                print(f"Failure parsing: {line.strip()}", file=sys.stderr)
-        self.conn.commit()
+        self.read_input(sys.stdin)
 
     def read_files(self):
         print("Reading data from FILES")
-        cur = self.conn.cursor()
-        for path in sys.stdin:
-            try:
-                with open(path.strip(), 'rb') as f:
-                    byte_line = list(bytearray(f.read(self.sz)))
-                    if len(byte_line) < self.sz:
-                        byte_line.extend([None] * (self.sz - len(byte_line)))
-                    iq = f"INSERT INTO records {self.colnames} VALUES {self.valnames};"
-                    cur.execute(iq, byte_line)
-            except Exception as e:
-                print(f"Failure parsing: {path.strip()}, {e}", file=sys.stderr)
-        self.conn.commit()
+        self.read_input(sys.stdin)
+
+    def read_binary(self):
+        print(f"Reading {self.fmt} data from STDIN")
+        self.read_input(sys.stdin.buffer)
 
     def get_val_counts_by_offset(self, o: int):
-        cur = self.conn.cursor()
-        res = cur.execute(
-            f"SELECT off_{o}, count(*) FROM records GROUP BY off_{o} ORDER BY count(*) ASC;"
-        )
-        return res.fetchall()
+        return self.index.val_counts(o)
+
+    def byte_offset(self, o: int) -> int:
+        """Position in the samples of the first byte of offset o."""
+        return self.offset + o * self.width
+
+    def value_name(self, o: int, v: int | None) -> str | None:
+        """Label to draw instead of the formatted value, for views whose nodes are not plain values."""
+        return None
+
+    def value_color(self, o: int, v: int | None) -> str | None:
+        """Fill to draw instead of the value's byte-class color, for views that color by something else."""
+        return None
 
     def get_edge_counts_by_offsets(self, o0: int, o1: int):
-        cur = self.conn.cursor()
-        res = cur.execute(
-            f"SELECT off_{o0}, off_{o1}, count(*) AS ect from records GROUP BY off_{o0}, off_{o1};"
-        )
-        return res.fetchall()
+        if o1 == o0 + 1:
+            return self.index.edge_counts(o0)
+        if self.records is None:
+            raise ValueError("edge counts between non-adjacent offsets need stored samples")
+        pairs = Counter(zip(self.records.column(o0), self.records.column(o1)))
+        return sorted(((src, dst, ct) for (src, dst), ct in pairs.items()), key=edge_sort_key)
+
+    def seed_masks(self, seeds: set[tuple[int, int]]) -> list[int]:
+        """Per-offset bitsets of the seed values."""
+        masks = [0] * self.sz
+        for o, v in seeds:
+            b = self.index.to_bin(o, v) if 0 <= o < self.sz else None
+            if b is not None:
+                masks[o] |= 1 << b
+        return masks
 
     def get_downstream_from(self, seeds: set[tuple[int, int]]) -> set[tuple[int, int]]:
         """All (offset, value) nodes reachable by following edges forward from seeds."""
         if not seeds:
             return set()
         reachable = set(seeds)
-        for o in range(0, self.sz - 1):
-            for (off, val) in list(reachable):
-                if off != o:
-                    continue
-                for row in self.get_edge_counts_by_offsets(o, o + 1):
-                    if row[0] == val:
-                        reachable.add((o + 1, row[1]))
+        seed_masks = self.seed_masks(seeds)
+        frontier = 0
+        for o in range(0, self.sz):
+            frontier |= seed_masks[o]
+            reachable.update((o, self.index.from_bin(o, b)) for b in iter_bits(frontier))
+            if o < self.sz - 1 and frontier:
+                frontier = self.index.step(o, frontier)
         return reachable
 
+    def offset_stats(self, detect_counters: bool = True) -> "ColumnList":
+        """Entropy, distinct values, field kind and mutual information with the next offset, per offset.
+
+        Computed from the count tables, except counter detection, which needs the
+        stored samples in arrival order and is None ("unknown") without them. For
+        multi-byte fields the words behind the OTHER node each occur at most
+        present / (capacity + 1) times, so entropy and distinct are lower bounds that
+        split OTHER into as few such words as fit; mutual information counts it as
+        one value, like the edges do. Each offset is analyzed when it is first looked
+        up, so a view that shows a few columns only pays for those.
+        """
+        key = (self.index, self.index.version, detect_counters)
+        if self._stats_key == key:
+            return self._stats
+        ordered = detect_counters and self.records is not None and self.policy != "reservoir"
+        recent = []  # the last ANALYSIS_ROWS rows per offset, read once the first counter check needs them
+
+        def offset_stat(o: int) -> dict:
+            if ordered and not recent:
+                recent.append(self.records.recent_columns(self.ANALYSIS_ROWS))
+            return self.offset_stat(o, recent[0] if ordered else None)
+
+        stats = ColumnList(self.sz, offset_stat)
+        self._stats_key, self._stats = key, stats
+        return stats
+
+    def offset_stat(self, o: int, recent: list | None) -> dict:
+        """offset_stats of one offset; recent holds the recent rows' columns to check for counters, or is None."""
+        bits = 8 * self.width
+        val_counts = self.get_val_counts_by_offset(o)
+        counts = [ct for _, ct in val_counts]
+        untracked = sum(ct for v, ct in val_counts if v == OTHER)
+        h_lumped = h = entropy(counts)
+        if untracked:
+            most = max(self.index.present[o] // (self.index.capacity + 1), 1)
+            full, rest = divmod(untracked, most)
+            counts = [ct for v, ct in val_counts if v != OTHER] + [most] * full + [rest] * (rest > 0)
+            h = entropy(counts)
+        mi = None
+        if o < self.sz - 1:
+            h_next = entropy(ct for _, ct in self.get_val_counts_by_offset(o + 1))
+            mi = max(h_lumped + h_next - entropy(self.index.edge_count_values(o)), 0.0)
+        counter = None
+        if recent is not None:
+            steps = counter_steps(recent[o] if o < len(recent) else (), 1 << bits)
+            counter = steps is not None and steps >= self.COUNTER_STEPS
+        max_h = math.log2(min(self.index.rows, 1 << bits)) if self.index.rows else 0.0
+        if 2 * untracked > self.index.rows:
+            kind = "random"  # mostly words too rare to track, whatever the entropy of the rest
+        elif len(counts) <= 1:
+            kind = "constant"
+        elif counter:
+            kind = "counter"
+        elif len(counts) > 2 and h >= self.RANDOM_ENTROPY * max_h:
+            kind = "random"
+        else:
+            kind = "field"
+        return {"offset": self.byte_offset(o), "kind": kind, "entropy": h, "distinct": len(counts), "counter": counter, "mi_next": mi}
+
     def get_visible_nodes_filtered(self, seeds: set[tuple[int, int]]) -> set[tuple[int, int]]:
         """Per-offset filter: at each offset, show only seed values at that offset (if any), else show nodes reachable from previous offset."""
         if not seeds:
             return set()
         visible = set()
-        values_at_0 = {v for (v, _) in self.get_val_counts_by_offset(0)}
-        seeds_at_0 = {v for (o, v) in seeds if o == 0}
-        if seeds_at_0:
-            visible |= {(0, v) for v in (seeds_at_0 & values_at_0)}
-        else:
-            visible |= {(0, v) for v in values_at_0}
-        for o in range(1, self.sz):
-            values_at_o = {v for (v, _) in self.get_val_counts_by_offset(o)}
-            reachable = set()
-            for row in self.get_edge_counts_by_offsets(o - 1, o):
-                v_prev, v_cur, _ = row[0], row[1], row[2]
-                if (o - 1, v_prev) in visible:
-                    reachable.add(v_cur)
-            seeds_at_o = {v for (o2, v) in seeds if o2 == o}
-            if seeds_at_o:
-                show_o = (seeds_at_o & values_at_o)
+        seed_masks = self.seed_masks(seeds)
+        show = 0
+        for o in range(0, self.sz):
+            values = self.index.value_mask(o)
+            if seed_masks[o]:
+                show = seed_masks[o] & values
+            elif o == 0:
+                show = values
             else:
-                show_o = reachable & values_at_o
-            visible |= {(o, v) for v in show_o}
+                show = self.index.step(o - 1, show) & values
+            visible.update((o, self.index.from_bin(o, b)) for b in iter_bits(show))
         return visible
 
+    def row_bitmaps(self, o: int) -> dict:
+        """RowBitmap of the stored rows holding each value at offset o, built on first use."""
+        if self.records is None:
+            raise ValueError("exact matching needs stored samples")
+        key = (self.index, self.index.version)
+        if self._bitmaps_key != key:
+            self._bitmaps_key, self._bitmaps = key, {}
+        bitmaps = self._bitmaps.get(o)
+        if bitmaps is None:
+            bitmaps = self._bitmaps[o] = column_bitmaps(self.records.column(o))
+        return bitmaps
+
+    def match_rows(self, seeds: set[tuple[int, int]]) -> RowBitmap:
+        """Rows of the samples holding, at every seeded offset, one of the seed values there.
+
+        Unlike get_visible_nodes_filtered, which follows adjacent transitions and may
+        join paths that no single sample takes, this is exact.
+        """
+        values = {}
+        for o, v in seeds:
+            values.setdefault(o, set()).add(v)
+        matches = None
+        # Intersect the rarest offsets first so the running result shrinks quickly
+        unions = []
+        for o, vals in values.items():
+            bitmaps = self.row_bitmaps(o) if 0 <= o < self.sz else {}
+            union = RowBitmap()
+            for v in vals:
+                union = union | bitmaps.get(v, RowBitmap())
+            unions.append(union)
+        for union in sorted(unions, key=len):
+            matches = union if matches is None else matches & union
+            if not matches:
+                break
+        return matches if matches is not None else RowBitmap()
+
+    def matching_indexes(self, seeds: set[tuple[int, int]]) -> tuple[HistogramIndex, list[HistogramIndex]]:
+        """Count tables of only the samples that match_rows(seeds) finds, overall and per corpus."""
+        key = (self.index, self.index.version, frozenset(seeds))
+        if self._match_key != key:
+            rows = list(self.match_rows(seeds))
+            samples = self.records.select(rows)
+            index = HistogramIndex(self.sz)
+            index.add_samples(samples)
+            corpus_indexes = [HistogramIndex(self.sz) for _ in self.corpus_labels]
+            if self.sources is not None:
+                by_corpus = [[] for _ in self.corpus_labels]
+                for row, sample in zip(rows, samples):
+                    by_corpus[self.sources[row]].append(sample)
+                for corpus_index, corpus_samples in zip(corpus_indexes, by_corpus):
+                    corpus_index.add_samples(corpus_samples)
+            self._match_key, self._match = key, (index, corpus_indexes)
+        return self._match
+
+    def clusters(self, depth: int = 16, min_share: float = 0.01) -> list[tuple[frozenset, int]]:
+        """Group the stored samples by structure, as (seeds, samples) pairs, largest first.
+
+        Walks a prefix trie over the first depth offsets: a group of samples is split
+        at an offset when at most CLUSTER_MAX_BRANCH values, each held by at least
+        min_share of all samples, cover CLUSTER_COVERAGE of the group (a type byte);
+        other offsets (lengths, counters, payload) are skipped. A cluster is then
+        exactly the samples holding its seeds, the values it was split on, so
+        MatchedDag(dag, seeds) is its DAG. Samples with rare values at a split offset
+        belong to no cluster. Costs one pass over the rows per offset.
+        """
+        if self.records is None:
+            raise ValueError("clustering needs stored samples")
+        key = (self.index, self.index.version, depth, min_share)
+        if self._clusters_key == key:
+            return self._clusters
+        min_size = max(min_share * self.index.rows, 1)
+        groups = [((), array("I", range(len(self.records))))]
+        for o in range(min(depth, self.sz)):
+            column = self.records.column(o)
+            split = []
+            for seeds, rows in groups:
+                children = {}
+                for r in rows:
+                    v = column[r]
+                    child = children.get(v)
+                    if child is None:
+                        child = children[v] = array("I")
+                    child.append(r)
+                kept = [(v, child) for v, child in children.items() if v is not None and len(child) >= min_size]
+                if 2 <= len(kept) <= self.CLUSTER_MAX_BRANCH and sum(len(child) for _, child in kept) >= self.CLUSTER_COVERAGE * len(rows):
+                    split += [(seeds + ((o, v),), child) for v, child in kept]
+                else:
+                    split.append((seeds, rows))
+            groups = split
+        clusters = sorted(((frozenset(seeds), len(rows)) for seeds, rows in groups), key=lambda c: -c[1])
+        self._clusters_key, self._clusters = key, clusters
+        return clusters
+
+    def seed_signature(self, seeds) -> str:
+        """Seeds as HEX@POSITION words, e.g. a cluster's signature."""
+        return " ".join(f"{v:0{2 * self.width}X}@{self.byte_offset(o)}" for o, v in sorted(seeds)) or "(all samples)"
+
+
+class MatchedDag(Dag):
+    """The samples of a Dag that hold all the seeds: the Dag re-weighted by Dag.match_rows.
+
+    Shares the Dag's settings and analysis code, but has no stored samples of its own.
+    """
+
+    def __init__(self, dag: Dag, seeds: set[tuple[int, int]]):
+        parser = dag.parser
+        self.init_settings(None, dag.fmt, dag.sz, "none", dag.offset, parser.use_mmap, 1, None, None, 0, parser.aligner, dag.width, dag.byteorder, dag.top,
+                           dag.corpus_labels, parser.payload, dag.record_prefix)
+        self.seeds = frozenset(seeds)
+        self.index, self.corpus_indexes = dag.matching_indexes(self.seeds)
+
+
+class SimplifiedDag:
+    """A smaller view of a Dag for drawing, with the Dag's query interface.
+
+    Runs of constant offsets become one column with a composite node, columns of
+    single bytes with at least bucket_distinct values get one node per byte class
+    (BYTE_CLASSES, keyed by the class's first byte), and edges carrying fewer than
+    max(min_edge, min_share * rows) samples are dropped. Node counts are the Dag's,
+    summed per class, so heights stay exact; only pruned edges are missing.
+    """
 
-class CanvasApp(tk.Tk):
-    # Theme: dark, modern palette
-    THEME = {
-        "bg": "#0f0f14",
-        "toolbar_bg": "#16161e",
-        "canvas_bg": "#1a1a24",
-        "node_outline": "#3d3d5c",
-        "node_outline_width": 2,
-        "node_text": "#e4e4e7",
-        "node_text_light": "#fafafa",
-        "font": ("Consolas", 10),
-        "toolbar_fg": "#a0a0b0",
-        "accent": "#7c3aed",
-    }
-
-    def __init__(self, dag: Dag):
-        super().__init__()
+    def __init__(self, dag: Dag, bucket_distinct: int = 64, min_edge: int = 1, min_share: float = 0.0):
         self.dag = dag
-        self.xpad = 150
-        self.ypad = 150
-        self.theme = self.THEME.copy()
-        self.display_options = {"decimal": True, "hex": True, "binary": True, "ascii": True}
-        self.filter_seeds: set[tuple[int, int]] = set()  # (offset, value) — click to filter, Ctrl+click to add
-
-        self.title("DAGUIRE")
-        self.configure(bg=self.theme["bg"])
-        if sys.platform == "win32":
-            self.state("zoomed")
-        else:
-            self.wm_attributes("-zoomed", 1)
-
-        self._setup_styles()
-        self._build_toolbar()
-        self.frame = tk.Frame(self, bg=self.theme["bg"])
-        self.frame.pack(fill="both", expand=True)
-        self.canvas = tk.Canvas(self.frame, bg=self.theme["canvas_bg"], highlightthickness=0)
-        self.canvas.pack(side="left", fill="both", expand=True)
-        self.canvas.bind("<MouseWheel>", self.on_mousewheel)
-        self.canvas.bind("<Button-4>", self.on_mousewheel)
-        self.canvas.bind("<Button-5>", self.on_mousewheel)
-        self.canvas.bind("<ButtonPress-1>", self.on_button_press)
-        self.canvas.bind("<B1-Motion>", self.pan_canvas)
-        self.canvas.bind("<ButtonRelease-1>", self.on_button_release)
-
-        self.draw_dag()
-
-    def _setup_styles(self):
-        style = ttk.Style()
-        style.theme_use("clam")
-        style.configure(
-            "Toolbar.TFrame",
-            background=self.theme["toolbar_bg"],
-        )
-        style.configure(
-            "Toolbar.TCheckbutton",
-            background=self.theme["toolbar_bg"],
-            foreground=self.theme["toolbar_fg"],
-            font=self.theme["font"],
-        )
-        style.configure(
-            "Toolbar.TButton",
-            background=self.theme["toolbar_bg"],
-            foreground=self.theme["toolbar_fg"],
-            font=self.theme["font"],
-        )
-        style.map("Toolbar.TButton", background=[("active", self.theme["accent"])])
-        style.configure(
-            "Toolbar.TLabel",
-            background=self.theme["toolbar_bg"],
-            foreground=self.theme["toolbar_fg"],
-            font=self.theme["font"],
-        )
-
-    def _build_toolbar(self):
-        toolbar = ttk.Frame(self, style="Toolbar.TFrame", padding=(10, 8))
-        toolbar.pack(fill="x")
-
-        ttk.Button(toolbar, text="Save as SVG…", style="Toolbar.TButton", command=self.save_canvas_as_svg).pack(side="left", padx=(0, 16))
-        ttk.Button(toolbar, text="Save as PS…", style="Toolbar.TButton", command=self.save_canvas_as_ps).pack(side="left", padx=(0, 16))
-        ttk.Button(toolbar, text="Fit to Canvas", style="Toolbar.TButton", command=self.fit_to_canvas).pack(side="left", padx=(0, 16))
-
-        sep = tk.Frame(toolbar, width=1, bg=self.theme["node_outline"])
-        sep.pack(side="left", fill="y", padx=8, pady=2)
-
-        label = ttk.Label(toolbar, text="Node label:", style="Toolbar.TLabel")
-        label.pack(side="left", padx=(0, 6))
-        for key, label_text in [("decimal", "Dec"), ("hex", "Hex"), ("binary", "Bin"), ("ascii", "ASCII")]:
-            var = tk.BooleanVar(value=self.display_options[key])
-            var.trace_add("write", self._on_display_option_changed)
-            self.display_options[f"_var_{key}"] = var
-            cb = ttk.Checkbutton(toolbar, text=label_text, variable=var, style="Toolbar.TCheckbutton")
-            cb.pack(side="left", padx=2)
-
-        # Filter bar (second row): shows filter seeds and Clear
-        self.filter_bar = ttk.Frame(self, style="Toolbar.TFrame", padding=(10, 4))
-        self.filter_bar.pack(fill="x")
-        self._filter_chips_frame = ttk.Frame(self.filter_bar, style="Toolbar.TFrame")
-        self._filter_chips_frame.pack(side="left", fill="x", expand=True)
-        self._filter_placeholder = ttk.Label(
-            self.filter_bar, text="Filter: click a node to show only downstream; Ctrl+click to add", style="Toolbar.TLabel"
-        )
-        self._filter_placeholder.pack(side="left")
-        self._update_filter_bar()
-
-    def _update_filter_bar(self):
-        for w in self._filter_chips_frame.winfo_children():
-            w.destroy()
-        if not self.filter_seeds:
-            self._filter_placeholder.pack(side="left")
-            return
-        self._filter_placeholder.pack_forget()
-        ttk.Label(self._filter_chips_frame, text="Filter:", style="Toolbar.TLabel").pack(side="left", padx=(0, 6))
-        for (offset, val) in sorted(self.filter_seeds):
-            chip = ttk.Frame(self._filter_chips_frame, style="Toolbar.TFrame")
-            chip.pack(side="left", padx=2)
-            lbl = ttk.Label(chip, text=f"0x{val:02X} @ {offset}", style="Toolbar.TLabel")
-            lbl.pack(side="left", padx=(4, 2), pady=2)
-            btn = ttk.Button(chip, text="×", style="Toolbar.TButton", width=2, command=lambda o=offset, v=val: self._remove_filter_seed(o, v))
-            btn.pack(side="left", padx=(0, 4), pady=2)
-        ttk.Button(self._filter_chips_frame, text="Clear", style="Toolbar.TButton", command=self._clear_filter).pack(side="left", padx=(8, 0))
-
-    def _remove_filter_seed(self, offset: int, val: int):
-        self.filter_seeds.discard((offset, val))
-        self._update_filter_bar()
-        self.redraw_dag()
-
-    def _clear_filter(self):
-        self.filter_seeds.clear()
-        self._update_filter_bar()
-        self.redraw_dag()
-
-    def _on_display_option_changed(self, *args):
-        for k in ("decimal", "hex", "binary", "ascii"):
-            var = self.display_options.get(f"_var_{k}")
-            if isinstance(var, tk.BooleanVar):
-                self.display_options[k] = var.get()
-        self.redraw_dag()
-
-    def redraw_dag(self):
-        self.canvas.delete("all")
-        self.draw_dag()
-
-    def save_canvas_as_svg(self):
-        filepath = asksaveasfilename(defaultextension=".svg", filetypes=[("SVG files", "*.svg"), ("All Files", "*.*")])
-        if not filepath:
-            return
-        self._write_svg(filepath)
+        self.bucket_distinct = bucket_distinct
+        self.min_edge = min_edge
+        self.min_share = min_share
+        self._key = None
 
-    def save_canvas_as_ps(self):
-        filepath = asksaveasfilename(defaultextension=".eps", filetypes=[("PostScript files", "*.eps"), ("All Files", "*.*")])
-        if not filepath:
-            return
-        self.update()
-        self.canvas.postscript(file=filepath, colormode='color')
-
-    def _write_svg(self, filepath: str):
-        """Export current DAG view to lossless SVG using the same layout as the canvas."""
-        visible_nodes = self.dag.get_visible_nodes_filtered(self.filter_seeds) if self.filter_seeds else None
-        col_height = 600
-        node_width = 150
-        r = 25
-        prev_offset_nodes = []
-        x_offset = 0
-        shapes = []  # (kind, ...) for nodes/edges
-        layout_max_y = 0
-        for o in range(0, self.dag.sz):
-            nodes = []
-            for v, vct in self.dag.get_val_counts_by_offset(o):
-                if visible_nodes is None or (o, v) in visible_nodes:
-                    nodes.append(Node(o, v, vct))
-            total_ratio = sum(n.ratio for n in nodes)
-            y_position = 0
-            for node in nodes:
-                height = (node.ratio / total_ratio) * (col_height - 2 * self.ypad) if total_ratio else 0
-                x1, y1 = x_offset, y_position
-                x2, y2 = x_offset + node_width, y_position + height
-                if node.val is not None:
-                    label = format_byte_label(node.val, self.display_options)
-                    text_fill = self.theme["node_text_light"] if node.val == 0x00 else self.theme["node_text"]
-                    node.setcordinates((x1, y1, x2, y2))
-                    shapes.append(("node", x1, y1, x2, y2, node.color, self.theme["node_outline"], label, text_fill))
-                y_position += height + self.ypad
-            layout_max_y = max(layout_max_y, y_position)
-            if o != 0:
-                edges = self.dag.get_edge_counts_by_offsets(o - 1, o)
-                o_prev, o_curr = o - 1, o
-                for edge in edges:
-                    if edge[0] is None or edge[1] is None:
-                        continue
-                    src_val, dst_val = edge[0], edge[1]
-                    if visible_nodes is not None:
-                        if (o_prev, src_val) not in visible_nodes or (o_curr, dst_val) not in visible_nodes:
-                            continue
-                    src_node = next((n for n in prev_offset_nodes if n.val == src_val), None)
-                    dst_node = next((n for n in nodes if n.val == dst_val), None)
-                    if src_node is None or dst_node is None:
-                        continue
-                    _, sy1, sx2, sy2 = src_node.coordinates
-                    dx1, dy1, _, dy2 = dst_node.coordinates
-                    x1 = sx2
-                    y1 = sy1 + (sy2 - sy1) / 2
-                    x2 = dx1
-                    y2 = dy1 + (dy2 - dy1) / 2
-                    shapes.append(("edge", x1, y1, x2, y2))
-            x_offset += self.xpad * 2
-            prev_offset_nodes = nodes
-        # Use full layout extent so nothing is clipped (right/bottom columns can extend past shape max)
-        layout_right = (self.dag.sz - 1) * (self.xpad * 2) + node_width + self.xpad
-        layout_bottom = layout_max_y + self.ypad
-        if not shapes:
-            w, h = 800, 600
+    @property
+    def index(self):
+        return self.dag.index
+
+    @property
+    def width(self) -> int:
+        return self.dag.width
+
+    @property
+    def sz(self) -> int:
+        return len(self.build()[0])
+
+    def build(self):
+        """(spans, val_counts, edges, names) of the view, recomputed whenever the Dag's counts change."""
+        key = (self.dag.index, self.dag.index.version)
+        if self._key == key:
+            return self._view
+        dag = self.dag
+        spans, counts, bucketed = [], [], []
+        for o in range(dag.sz):
+            vc = dag.get_val_counts_by_offset(o)
+            constant = len(vc) == 1
+            if constant and spans and spans[-1][2]:
+                first, _, _ = spans[-1]
+                spans[-1] = (first, o, True)
+                continue
+            bucket = dag.width == 1 and sum(v is not None for v, _ in vc) >= self.bucket_distinct
+            if bucket:
+                classes = Counter()
+                for v, ct in vc:
+                    classes[None if v is None else BYTE_CLASS_OF[v]] += ct
+                vc = sorted(classes.items(), key=lambda r: (r[0] is not None, r[0] or 0))
+                vc.sort(key=lambda r: r[1])
+            spans.append((o, o, constant))
+            counts.append(vc)
+            bucketed.append(bucket)
+        threshold = max(self.min_edge, self.min_share * dag.index.rows)
+        edges = []
+        for k in range(len(spans) - 1):
+            src_o, dst_o = spans[k][1], spans[k + 1][0]
+            pairs = dag.get_edge_counts_by_offsets(src_o, dst_o)
+            if src_o > spans[k][0]:
+                # Edges leave a merged run from its last offset, but its node holds the first one's value
+                pairs = [(counts[k][0][0], dst, ct) for _, dst, ct in pairs]
+            if bucketed[k] or bucketed[k + 1]:
+                merged = Counter()
+                for src, dst, ct in pairs:
+                    if bucketed[k] and src is not None:
+                        src = BYTE_CLASS_OF[src]
+                    if bucketed[k + 1] and dst is not None:
+                        dst = BYTE_CLASS_OF[dst]
+                    merged[src, dst] += ct
+                pairs = sorted(((src, dst, ct) for (src, dst), ct in merged.items()), key=edge_sort_key)
+            edges.append([e for e in pairs if e[2] >= threshold])
+        names = {}
+        for k, (first, last, constant) in enumerate(spans):
+            if bucketed[k]:
+                names.update(((k, v), BYTE_CLASS_NAMES[v]) for v, _ in counts[k] if v is not None)
+            elif constant and last > first:
+                run = [dag.get_val_counts_by_offset(o)[0][0] for o in range(first, last + 1)]
+                if None not in run:
+                    hex_bytes = " ".join(f"{v:0{2 * dag.width}X}" for v in run)
+                    names[k, run[0]] = f"{hex_bytes}\n{last - first + 1} constant"
+        self._key, self._view = key, (spans, counts, edges, names)
+        return self._view
+
+    def get_val_counts_by_offset(self, o: int):
+        return self.build()[1][o]
+
+    def get_edge_counts_by_offsets(self, o0: int, o1: int):
+        if o1 != o0 + 1:
+            raise ValueError("a simplified view only has edges between neighboring columns")
+        return self.build()[2][o0]
+
+    def byte_offset(self, o: int) -> int:
+        return self.dag.byte_offset(self.build()[0][o][0])
+
+    def value_name(self, o: int, v: int | None) -> str | None:
+        return self.build()[3].get((o, v))
+
+    def value_color(self, o: int, v: int | None) -> str | None:
+        return None
+
+    def offset_stats(self, detect_counters: bool = True) -> "ColumnList":
+        """The Dag's offset_stats of the first offset of each column; merged runs are constant."""
+        stats = self.dag.offset_stats(detect_counters)
+        spans = self.build()[0]
+
+        def column_stat(o: int) -> dict:
+            first, last, _ = spans[o]
+            if last > first:
+                return dict(stats[first], kind="constant", entropy=0.0, distinct=1)
+            return stats[first]
+
+        return ColumnList(len(spans), column_stat)
+
+    def get_visible_nodes_filtered(self, seeds: set[tuple[int, int]]) -> set[tuple[int, int]]:
+        _, counts, edges, _ = self.build()
+        return filter_columns(counts, edges, seeds)
+
+
+def filter_columns(counts, edges, seeds: set[tuple[int, int]]) -> set[tuple[int, int]]:
+    """Dag.get_visible_nodes_filtered's per-column rule over a view's val_counts and edges per column."""
+    if not seeds:
+        return set()
+    visible = set()
+    show = set()
+    for o, vc in enumerate(counts):
+        values = {v for v, _ in vc}
+        at_o = {v for so, v in seeds if so == o}
+        if at_o:
+            show = at_o & values
+        elif o == 0:
+            show = values
         else:
-            shape_max_x = max(s[2] if s[0] == "node" else max(s[1], s[2]) for s in shapes)
-            shape_max_y = max(s[4] if s[0] == "node" else max(s[3], s[4]) for s in shapes)
-            w = int(max(shape_max_x, layout_right) + self.xpad)
-            h = int(max(shape_max_y, layout_bottom) + self.ypad)
-        font_name, font_size = self.theme["font"][0], self.theme["font"][1]
-        lines = [
-            '<?xml version="1.0" encoding="UTF-8"?>',
-            f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {w} {h}" width="{w}" height="{h}">',
-            f'  <defs><marker id="arrow" markerWidth="10" markerHeight="7" refX="9" refY="3.5" orient="auto"><polygon points="0 0, 10 3.5, 0 7" fill="{self.theme["node_text"]}"/></marker></defs>',
-            f'  <rect width="{w}" height="{h}" fill="{self.theme["canvas_bg"]}"/>',
-        ]
-        for s in shapes:
-            if s[0] == "edge":
-                _, x1, y1, x2, y2 = s
-                lines.append(f'  <line x1="{x1:.1f}" y1="{y1:.1f}" x2="{x2:.1f}" y2="{y2:.1f}" stroke="{self.theme["node_text"]}" stroke-width="2" marker-end="url(#arrow)"/>')
-        for s in shapes:
-            if s[0] == "node":
-                _, x1, y1, x2, y2, fill, stroke, label, text_fill = s
-                lines.append(f'  <rect x="{x1:.1f}" y="{y1:.1f}" width="{x2-x1:.1f}" height="{y2-y1:.1f}" rx="{r}" ry="{r}" fill="{fill}" stroke="{stroke}" stroke-width="{self.theme["node_outline_width"]}"/>')
-                text_x, text_y = (x1 + x2) / 2, (y1 + y2) / 2
-                label_lines = label.split("\n")
-                line_height = font_size * 1.2
-                start_y = text_y - (len(label_lines) - 1) * line_height / 2
-                for i, line in enumerate(label_lines):
-                    escaped = saxutils.escape(line)
-                    dy = start_y + i * line_height
-                    lines.append(f'  <text x="{text_x:.1f}" y="{dy:.1f}" text-anchor="middle" dominant-baseline="middle" fill="{text_fill}" font-family="{font_name}" font-size="{font_size}">{escaped}</text>')
-        lines.append("</svg>")
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write("\n".join(lines))
-
-    def fit_to_canvas(self):
-        self.canvas.update_idletasks()
-        bbox = self.canvas.bbox("all")
-        if not bbox:
-            return
-        cw = self.canvas.winfo_width()
-        ch = self.canvas.winfo_height()
-        if cw <= 1 or ch <= 1:
-            return
-        content_w = bbox[2] - bbox[0]
-        content_h = bbox[3] - bbox[1]
-        if content_w <= 0 or content_h <= 0:
-            return
-        margin = 0.9
-        scale = min(cw / content_w, ch / content_h) * margin
-        cx = (bbox[0] + bbox[2]) / 2
-        cy = (bbox[1] + bbox[3]) / 2
-        self.canvas.scale("all", cx, cy, scale, scale)
-        bbox2 = self.canvas.bbox("all")
-        if not bbox2:
-            return
-        self.canvas.configure(scrollregion=bbox2)
-        sw = bbox2[2] - bbox2[0]
-        sh = bbox2[3] - bbox2[1]
-        center_x = (bbox2[0] + bbox2[2]) / 2
-        center_y = (bbox2[1] + bbox2[3]) / 2
-        fx = max(0, min(1, (center_x - cw / 2) / sw)) if sw > 0 else 0
-        fy = max(0, min(1, (center_y - ch / 2) / sh)) if sh > 0 else 0
-        self.canvas.xview_moveto(fx)
-        self.canvas.yview_moveto(fy)
-
-    def on_mousewheel(self, event):
-        if event.delta > 0 or event.num == 4:
-            scale_factor = 1.1
+            show = {dst for src, dst, _ in edges[o - 1] if src in show} & values
+        visible.update((o, v) for v in show)
+    return visible
+
+
+class DiffDag:
+    """The corpora of a Dag compared: the first corpus is the baseline, the others are pooled.
+
+    A node's change is the difference of its shares of the pooled and the baseline
+    samples ("delta"), or the log2 ratio of those shares ("ratio"). Nodes are colored
+    by it and, with size_by_change, sized by how much they changed. With min_change,
+    only the offsets whose two distributions are at least that far apart (total
+    variation distance, 0 to 1) are kept as columns. Everything is computed from the
+    corpora's count tables.
+    """
+
+    MEASURES = ("delta", "ratio")
+    # Ratios are clipped to this many doublings either way
+    RATIO_CLIP = 6.0
+
+    def __init__(self, dag: Dag, measure: str = "delta", size_by_change: bool = False, min_change: float | None = None):
+        if len(dag.corpus_indexes) < 2:
+            raise ValueError("comparing needs at least two corpora")
+        self.dag = dag
+        self.measure = measure
+        self.size_by_change = size_by_change
+        self.min_change = min_change
+        self._key = None
+
+    @property
+    def index(self):
+        return self.dag.index
+
+    @property
+    def width(self) -> int:
+        return self.dag.width
+
+    @property
+    def sz(self) -> int:
+        return len(self.build()[0])
+
+    def rows(self) -> tuple[int, int]:
+        """Samples in the baseline and in the pooled other corpora."""
+        return self.dag.corpus_indexes[0].rows, sum(index.rows for index in self.dag.corpus_indexes[1:])
+
+    @staticmethod
+    def shares(counts: list[int], base_rows: int, other_rows: int) -> tuple[float, float]:
+        return counts[0] / base_rows if base_rows else 0.0, sum(counts[1:]) / other_rows if other_rows else 0.0
+
+    def distance(self, corpus_counts: dict, base_rows: int, other_rows: int) -> float:
+        """Total variation distance between the baseline's and the others' values at an offset."""
+        return sum(abs(other - base) for base, other in (self.shares(cts, base_rows, other_rows) for cts in corpus_counts.values())) / 2
+
+    def change(self, counts: list[int], base_rows: int, other_rows: int) -> float:
+        base, other = self.shares(counts, base_rows, other_rows)
+        if self.measure == "delta":
+            return other - base
+        # Half a sample keeps shares of unseen values finite
+        floor = 0.5 / max(base_rows + other_rows, 1)
+        ratio = math.log2(max(other, floor) / max(base, floor))
+        return min(max(ratio, -self.RATIO_CLIP), self.RATIO_CLIP)
+
+    def build(self):
+        """(offsets, val_counts, edges, changes, distances) of the kept columns."""
+        key = (self.dag.index, self.dag.index.version)
+        if self._key == key:
+            return self._view
+        dag = self.dag
+        base_rows, other_rows = self.rows()
+        offsets, counts, changes, distances = [], [], {}, []
+        for o in range(dag.sz):
+            corpus_counts = dag.corpus_counts(o)
+            distance = self.distance(corpus_counts, base_rows, other_rows)
+            if self.min_change is not None and distance < self.min_change:
+                continue
+            k = len(offsets)
+            offsets.append(o)
+            distances.append(distance)
+            vc = dag.get_val_counts_by_offset(o)
+            for v, _ in vc:
+                changes[k, v] = self.change(corpus_counts.get(v, [0]), base_rows, other_rows)
+            if self.size_by_change:
+                # Unchanged nodes keep a sliver of height so they can still be clicked
+                floor = max((abs(changes[k, v]) for v, _ in vc), default=0.0) / 100 or 1.0
+                vc = sorted(((v, max(abs(changes[k, v]), floor)) for v, _ in vc), key=lambda r: r[1])
+            counts.append(vc)
+        edges = []
+        for o0, o1 in zip(offsets, offsets[1:]):
+            if o1 == o0 + 1 or dag.records is not None:
+                edges.append(dag.get_edge_counts_by_offsets(o0, o1))
+            else:
+                edges.append([])  # offsets in between were dropped and there are no samples to pair them
+        self._scale = max(map(abs, changes.values()), default=0.0) or 1.0
+        self._key, self._view = key, (offsets, counts, edges, changes, distances)
+        return self._view
+
+    def get_val_counts_by_offset(self, o: int):
+        return self.build()[1][o]
+
+    def get_edge_counts_by_offsets(self, o0: int, o1: int):
+        if o1 != o0 + 1:
+            raise ValueError("a compared view only has edges between neighboring columns")
+        return self.build()[2][o0]
+
+    def byte_offset(self, o: int) -> int:
+        return self.dag.byte_offset(self.build()[0][o])
+
+    def value_name(self, o: int, v: int | None) -> str | None:
+        return None
+
+    def value_color(self, o: int, v: int | None) -> str | None:
+        change = self.build()[3].get((o, v))
+        if change is None:
+            return None
+        return heat_color((change / self._scale + 1) / 2, DIFF_COLORS)
+
+    def offset_stats(self, detect_counters: bool = True) -> "ColumnList":
+        """The Dag's offset_stats of the kept offsets, each with its distance between the corpora."""
+        stats = self.dag.offset_stats(detect_counters)
+        offsets, _, _, _, distances = self.build()
+        return ColumnList(len(offsets), lambda o: dict(stats[offsets[o]], distance=distances[o]))
+
+    def get_visible_nodes_filtered(self, seeds: set[tuple[int, int]]) -> set[tuple[int, int]]:
+        _, counts, edges, _, _ = self.build()
+        return filter_columns(counts, edges, seeds)
+
+
+def entropy(counts) -> float:
+    """Shannon entropy in bits of a distribution given by its counts."""
+    # Large distributions (joint ones over value pairs) repeat the same few small counts
+    # many times, so each distinct count is weighed once
+    multiplicity = Counter(counts)
+    multiplicity.pop(0, None)
+    total = sum(ct * n for ct, n in multiplicity.items())
+    if not total:
+        return 0.0
+    return max(math.log2(total) - sum(n * ct * math.log2(ct) for ct, n in multiplicity.items()) / total, 0.0)
+
+
+def counter_steps(column, modulus: int) -> float | None:
+    """Share of consecutive rows whose value stays or grows by one (mod modulus); None if never changing."""
+    steps = Counter((b - a) % modulus for a, b in zip(column, column[1:]) if a is not None and b is not None)
+    total = sum(steps.values())
+    if not total or steps[0] == total:
+        return None
+    return (steps[0] + steps[1]) / total
+
+
+def node_table(nodes: list[Node]) -> dict[int | None, Node]:
+    """Value-indexed lookup for a column's placed nodes: table[v] is v's node."""
+    return {node.val: node for node in nodes}
+
+
+def layout_edges(src_table, dst_table, edges, offset: int, visible_nodes=None) -> list[tuple]:
+    """((offset, src, dst), (x1, y1, x2, y2), count) for the edges into column offset.
+
+    Endpoints are found through the node_table of each column, so laying out a column
+    pair costs one lookup per edge instead of a scan over the column's nodes.
+    """
+    o_prev = offset - 1
+    placed = []
+    for src_val, dst_val, ct in edges:
+        if src_val is None or dst_val is None:
+            continue
+        if visible_nodes is not None:
+            if (o_prev, src_val) not in visible_nodes or (offset, dst_val) not in visible_nodes:
+                continue
+        src_node = src_table.get(src_val)
+        dst_node = dst_table.get(dst_val)
+        if src_node is None or dst_node is None:
+            continue
+        _, sy1, sx2, sy2 = src_node.coordinates
+        dx1, dy1, _, dy2 = dst_node.coordinates
+        placed.append(((offset, src_val, dst_val), (sx2, sy1 + (sy2 - sy1) / 2, dx1, dy1 + (dy2 - dy1) / 2), ct))
+    return placed
+
+
+# Theme: dark, modern palette
+THEME = {
+    "bg": "#0f0f14",
+    "toolbar_bg": "#16161e",
+    "canvas_bg": "#1a1a24",
+    "node_outline": "#3d3d5c",
+    "node_outline_width": 2,
+    "node_text": "#e4e4e7",
+    "node_text_light": "#fafafa",
+    "font": ("Consolas", 10),
+    "toolbar_fg": "#a0a0b0",
+    "accent": "#7c3aed",
+}
+
+
+# Heat strip ramp from low to high entropy
+HEAT_COLORS = ((0x2b, 0x3a, 0x67), (0xb8, 0xa8, 0x4e), (0xc4, 0x5c, 0x5c))
+# Compared corpora: less common than in the baseline, unchanged, more common
+DIFF_COLORS = ((0x3b, 0x6e, 0xc4), (0x4a, 0x4a, 0x55), (0xd0, 0x5a, 0x4a))
+
+
+def heat_color(t: float, colors=HEAT_COLORS) -> str:
+    """Color for t in [0, 1] along colors."""
+    t = min(max(t, 0.0), 1.0) * (len(colors) - 1)
+    i = min(int(t), len(colors) - 2)
+    lo, hi = colors[i], colors[i + 1]
+    return "#" + "".join(f"{round(a + (b - a) * (t - i)):02x}" for a, b in zip(lo, hi))
+
+
+class ColumnList:
+    """Read-only sequence of per-column items, each computed by item(o) on first access and kept."""
+
+    def __init__(self, n: int, item):
+        self._n = n
+        self._item = item
+        self._items = {}
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, o: int):
+        if o < 0:
+            o += self._n
+        if not 0 <= o < self._n:
+            raise IndexError(o)
+        value = self._items.get(o)
+        if value is None:
+            value = self._items[o] = self._item(o)
+        return value
+
+    def __iter__(self):
+        return (self[o] for o in range(self._n))
+
+
+class Layout:
+    """Node rectangles and edge endpoints of one DAG view, in layout coordinates.
+
+    columns[o] are the drawable nodes of offset o (coordinates set), tables[o] their
+    node_table, edges[o] the layout_edges into offset o, column_x[o] the left edge of
+    the column and bbox the overall extent. Collapsed columns are narrow and empty.
+    columns, tables and edges may be ColumnLists, which place a column only when it
+    is first drawn. Values are width-byte fields, unless names has a label for the node.
+    """
+
+    def __init__(self, columns, tables, edges, bbox, column_x, node_radius, width=1, collapsed=frozenset(), names=None):
+        self.columns = columns
+        self.tables = tables
+        self.edges = edges
+        self.bbox = bbox
+        self.column_x = column_x
+        self.node_radius = node_radius
+        self.width = width
+        self.collapsed = collapsed
+        self.names = names if names is not None else {}
+
+    def label(self, offset: int, val: int | None, options: dict[str, bool]) -> str:
+        """Text of the node (offset, val): its view-given name or its formatted value."""
+        name = self.names.get((offset, val))
+        return name if name is not None else format_byte_label(val, options, self.width)
+
+    def column_at(self, x: float) -> int:
+        """The column whose slot contains x (clamped to the first and last column)."""
+        return min(max(bisect_right(self.column_x, x) - 1, 0), len(self.column_x) - 1)
+
+
+class LayoutEngine:
+    """Places the nodes and edges of a Dag without any renderer involved.
+
+    Layouts are memoized per (index state, filter seeds, collapsed columns), so the
+    canvas, SVG export and headless export share one pass over the Dag. Only column
+    positions and the extent are computed up front; nodes and edges are placed per
+    column on first use, so a window pays for the columns it shows. Labels only
+    depend on the display options and are left to the renderers.
+    """
+
+    NODE_WIDTH = 150
+    NODE_RADIUS = 25
+    # Width of a collapsed column, which is followed by a gap of the same size
+    COLLAPSED_WIDTH = 30
+    # The current layout and the one before, so toggling a filter or collapse back is free
+    MEMO_SIZE = 2
+
+    def __init__(self, dag: Dag, col_height: float = 600, xpad: int = 150, ypad: int = 150):
+        self.dag = dag
+        self.col_height = col_height
+        self.xpad = xpad
+        self.ypad = ypad
+        self.column_step = xpad * 2
+        self._memo = OrderedDict()
+
+    def layout(self, seeds=(), collapsed=frozenset()) -> Layout:
+        seeds = frozenset(seeds)
+        key = (self.dag.index, self.dag.index.version, seeds, collapsed)
+        layout = self._memo.get(key)
+        if layout is None:
+            layout = self.compute(seeds, collapsed)
+            self._memo[key] = layout
+            if len(self._memo) > self.MEMO_SIZE:
+                self._memo.popitem(last=False)
         else:
-            scale_factor = 0.9
-        x = self.canvas.canvasx(event.x)
-        y = self.canvas.canvasy(event.y)
-        self.canvas.scale("all", x, y, scale_factor, scale_factor)
-
-    # Pan sensitivity: Tk multiplies scan delta by 10, so we scale coords for 1:1 feel
-    PAN_GAIN = 0.1
-
-    def on_button_press(self, event):
-        self._pan_start = (event.x, event.y)
-        self.canvas.scan_mark(event.x, event.y)
-
-    def pan_canvas(self, event):
-        sx, sy = self._pan_start
-        # Pass coords so effective delta is (dx, dy) * PAN_GAIN; Tk then *10 → 1:1
-        # scan_dragto requires integers
-        x = int(sx + (event.x - sx) * self.PAN_GAIN)
-        y = int(sy + (event.y - sy) * self.PAN_GAIN)
-        self.canvas.scan_dragto(x, y)
-
-    _CLICK_THRESHOLD = 5
-
-    def on_button_release(self, event):
-        dx = abs(event.x - self._pan_start[0])
-        dy = abs(event.y - self._pan_start[1])
-        if dx > self._CLICK_THRESHOLD or dy > self._CLICK_THRESHOLD:
-            return  # was a pan, not a click
-        cx = self.canvas.canvasx(event.x)
-        cy = self.canvas.canvasy(event.y)
-        items = self.canvas.find_overlapping(cx, cy, cx, cy)
-        for iid in reversed(items):
-            tags = self.canvas.gettags(iid)
-            for t in tags:
-                if t.startswith("node_") and t != "node":
-                    parts = t.split("_")
-                    if len(parts) == 3:
-                        try:
-                            offset, val = int(parts[1]), int(parts[2])
-                            # Always add clicked node to filter (Ctrl or not); use Clear to reset
-                            self.filter_seeds.add((offset, val))
-                            self._update_filter_bar()
-                            self.redraw_dag()
-                        except ValueError:
-                            pass
-                    return
-
-    def create_round_rectangle(self, x1, y1, x2, y2, r=25, tags=(), **kwargs):
-        if "tags" in kwargs:
-            tags = kwargs.pop("tags")
-        points = (
-            x1 + r,
-            y1,
-            x1 + r,
-            y1,
-            x2 - r,
-            y1,
-            x2 - r,
-            y1,
-            x2,
-            y1,
-            x2,
-            y1 + r,
-            x2,
-            y1 + r,
-            x2,
-            y2 - r,
-            x2,
-            y2 - r,
-            x2,
-            y2,
-            x2 - r,
-            y2,
-            x2 - r,
-            y2,
-            x1 + r,
-            y2,
-            x1 + r,
-            y2,
-            x1,
-            y2,
-            x1,
-            y2 - r,
-            x1,
-            y2 - r,
-            x1,
-            y1 + r,
-            x1,
-            y1 + r,
-            x1,
-            y1,
-        )
-        return self.canvas.create_polygon(points, tags=tags, **kwargs, smooth=True)
-
-    def draw_nodes_on_canvas(self, nodes, x_offset: int, offset: int):
-        total_ratio = sum(node.ratio for node in nodes)
-        x_position = x_offset
+            self._memo.move_to_end(key)
+        return layout
+
+    def stack(self, counts) -> list[tuple[float, float]]:
+        """(top, bottom) of each drawable (non-None) value's node when a column's (value, count) pairs are stacked by count."""
+        total = sum(ct for _, ct in counts)
         y_position = 0
-        for node in nodes:
-            height = (node.ratio / total_ratio) * (
-                (self.winfo_screenheight()/2) - 2 * self.ypad
-            )
-            width = 150
-            x1, y1 = x_position, y_position
-            x2, y2 = x_position + width, y_position + height
-            if node.val is not None:
-                tag = f"node_{offset}_{node.val}"
-                tags = ("node", tag)
-                label = format_byte_label(node.val, self.display_options)
-                self.create_round_rectangle(
-                    x1, y1, x2, y2, 25, fill=node.color, outline=self.theme["node_outline"], width=self.theme["node_outline_width"], tags=tags
-                )
-                text_x = (x1 + x2) / 2
-                text_y = (y1 + y2) / 2
-                text_fill = self.theme["node_text_light"] if node.val == 0x00 else self.theme["node_text"]
-                self.canvas.create_text(
-                    text_x, text_y, text=label, fill=text_fill, anchor=tk.CENTER, font=self.theme["font"], tags=tags
-                )
-                node.setcordinates((x1, y1, x2, y2))
+        spans = []
+        for v, ct in counts:
+            height = (ct / total) * (self.col_height - 2 * self.ypad)
+            if v is not None:
+                spans.append((y_position, y_position + height))
                 y_position += height + self.ypad
+        return spans
+
+    def place_column(self, nodes: list[Node], x_offset: float) -> list[Node]:
+        """Stack a column's nodes by count; returns the drawable (non-None) ones with coordinates set."""
+        placed = [node for node in nodes if node.val is not None]
+        for node, (y1, y2) in zip(placed, self.stack([(node.val, node.ratio) for node in nodes])):
+            node.setcordinates((x_offset, y1, x_offset + self.NODE_WIDTH, y2))
+        return placed
+
+    def visible_counts(self, o: int, visible_nodes) -> list[tuple[int | None, int]]:
+        return [(v, ct) for v, ct in self.dag.get_val_counts_by_offset(o) if visible_nodes is None or (o, v) in visible_nodes]
+
+    def column_nodes(self, o: int, x: float, visible_nodes, names: dict) -> list[Node]:
+        """The placed nodes of column o, adding their view-given names to names."""
+        nodes = []
+        for v, vct in self.visible_counts(o, visible_nodes):
+            nodes.append(Node(o, v, vct))
+            name = self.dag.value_name(o, v)
+            if name is not None:
+                names[o, v] = name
+            color = self.dag.value_color(o, v)
+            if color is not None:
+                nodes[-1].color = color
+        return self.place_column(nodes, x)
+
+    def column_edges(self, o: int, tables, visible_nodes) -> list[tuple]:
+        # Edges are only drawn between neighbors, so none reach a collapsed column
+        if o == 0 or not tables[o - 1] or not tables[o]:
+            return []
+        return layout_edges(tables[o - 1], tables[o], self.dag.get_edge_counts_by_offsets(o - 1, o), o, visible_nodes)
+
+    def compute(self, seeds: frozenset, collapsed: frozenset = frozenset()) -> Layout:
+        """Column positions and the extent of the view; nodes and edges are placed per column on first use."""
+        visible_nodes = self.dag.get_visible_nodes_filtered(seeds) if seeds else None
+        column_x = []
+        bottom = 0
+        x = right = 0
+        for o in range(0, self.dag.sz):
+            column_x.append(x)
+            if o in collapsed:
+                right = x + self.COLLAPSED_WIDTH
+                x += 2 * self.COLLAPSED_WIDTH
+            else:
+                spans = self.stack(self.visible_counts(o, visible_nodes))
+                if spans:
+                    bottom = max(bottom, spans[-1][1])
+                right = x + self.NODE_WIDTH
+                x += self.column_step
+        names = {}
+        columns = ColumnList(self.dag.sz, lambda o: [] if o in collapsed else self.column_nodes(o, column_x[o], visible_nodes, names))
+        tables = ColumnList(self.dag.sz, lambda o: node_table(columns[o]))
+        edges = ColumnList(self.dag.sz, lambda o: self.column_edges(o, tables, visible_nodes))
+        return Layout(columns, tables, edges, (0, 0, right, bottom), column_x, self.NODE_RADIUS, self.dag.width, collapsed, names)
+
+
+SVG_WRITE_BUFFER = 1 << 20
+SVG_MAX_EDGE_WIDTH = 8
+
+
+def open_svg(filepath: str):
+    """Open filepath for writing SVG text, gzip-compressed when it ends in .svgz."""
+    import gzip
+    if filepath.endswith(".svgz"):
+        return gzip.open(filepath, "wt", encoding="utf-8")
+    return open(filepath, "w", encoding="utf-8", buffering=SVG_WRITE_BUFFER)
+
 
-        return nodes
+def svg_label_lines(label: str, font_size: float) -> list[tuple[float, str]]:
+    """Vertical offsets from the node center and escaped text of each label line."""
+    import html
+    label_lines = label.split("\n")
+    line_height = font_size * 1.2
+    start_y = -(len(label_lines) - 1) * line_height / 2
+    return [(start_y + i * line_height, html.escape(line, quote=False)) for i, line in enumerate(label_lines)]
 
-    def draw_edges_on_canvas(self, pnodes, nodes, edges, current_offset: int, visible_nodes=None):
-        o_prev, o_curr = current_offset - 1, current_offset
-        for edge in edges:
-            if edge[0] is not None and edge[1] is not None:
-                src_val, dst_val = (edge[0], edge[1])
-                if visible_nodes is not None:
-                    if (o_prev, src_val) not in visible_nodes or (o_curr, dst_val) not in visible_nodes:
+
+def write_svg(layout: Layout, filepath: str, theme=THEME, display_options=None, margin: int = 150,
+              merge_edges: bool = False, reuse_labels: bool = False):
+    """Stream a Layout to filepath as a lossless SVG document (.svgz is gzip-compressed).
+
+    merge_edges draws the edges between two columns as one <path> per stroke width,
+    widths growing with the edge count; reuse_labels defines each distinct label once
+    in <defs> and places it with <use>.
+    """
+    display_options = display_options or {}
+    r = layout.node_radius
+    if not any(layout.columns):
+        w, h = 800, 600
+    else:
+        w = int(layout.bbox[2] + 2 * margin)
+        h = int(layout.bbox[3] + 2 * margin)
+    font_name, font_size = theme["font"][0], theme["font"][1]
+    text_attrs = f'text-anchor="middle" dominant-baseline="middle" font-family="{font_name}" font-size="{font_size}"'
+    with open_svg(filepath) as f:
+        write = f.write
+        write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        xlink = ' xmlns:xlink="http://www.w3.org/1999/xlink"' if reuse_labels else ""
+        write(f'<svg xmlns="http://www.w3.org/2000/svg"{xlink} viewBox="0 0 {w} {h}" width="{w}" height="{h}">\n')
+        write(f'  <defs><marker id="arrow" markerWidth="10" markerHeight="7" refX="9" refY="3.5" orient="auto"><polygon points="0 0, 10 3.5, 0 7" fill="{theme["node_text"]}"/></marker></defs>\n')
+        label_ids = {}
+        if reuse_labels:
+            write("  <defs>\n")
+            for nodes in layout.columns:
+                for node in nodes:
+                    key = (layout.label(node.offset, node.val, display_options), node.val == 0x00)
+                    if key in label_ids:
                         continue
-                src_node = next((n for n in pnodes if n.val == src_val), None)
-                dst_node = next((n for n in nodes if n.val == dst_val), None)
-                if src_node is None or dst_node is None:
+                    label_ids[key] = label_id = f"l{len(label_ids)}"
+                    text_fill = theme["node_text_light"] if key[1] else theme["node_text"]
+                    write(f'    <g id="{label_id}" fill="{text_fill}" {text_attrs}>')
+                    for dy, text in svg_label_lines(key[0], font_size):
+                        write(f'<text y="{dy:.1f}">{text}</text>')
+                    write("</g>\n")
+            write("  </defs>\n")
+        write(f'  <rect width="{w}" height="{h}" fill="{theme["canvas_bg"]}"/>\n')
+        for column_edges in layout.edges:
+            if merge_edges:
+                write_merged_edges(write, column_edges, theme)
+                continue
+            for _, (x1, y1, x2, y2), _ in column_edges:
+                write(f'  <line x1="{x1:.1f}" y1="{y1:.1f}" x2="{x2:.1f}" y2="{y2:.1f}" stroke="{theme["node_text"]}" stroke-width="2" marker-end="url(#arrow)"/>\n')
+        for nodes in layout.columns:
+            for node in nodes:
+                x1, y1, x2, y2 = node.coordinates
+                write(f'  <rect x="{x1:.1f}" y="{y1:.1f}" width="{x2-x1:.1f}" height="{y2-y1:.1f}" rx="{r}" ry="{r}" fill="{node.color}" stroke="{theme["node_outline"]}" stroke-width="{theme["node_outline_width"]}"/>\n')
+                text_x, text_y = (x1 + x2) / 2, (y1 + y2) / 2
+                label = layout.label(node.offset, node.val, display_options)
+                if reuse_labels:
+                    write(f'  <use xlink:href="#{label_ids[label, node.val == 0x00]}" x="{text_x:.1f}" y="{text_y:.1f}"/>\n')
                     continue
-                _, sy1, sx2, sy2 = src_node.coordinates
-                dx1, dy1, _, dy2 = dst_node.coordinates
-                self.canvas.create_line(
-                    sx2, sy1 + (sy2 - sy1) / 2, dx1, dy1 + (dy2 - dy1) / 2,
-                    fill=self.theme["node_text"],
-                    width=2,
-                    smooth=True,
-                    arrow=tk.LAST,
-                )
-
-    def draw_dag(self):
-        visible_nodes = self.dag.get_visible_nodes_filtered(self.filter_seeds) if self.filter_seeds else None
-        prev_offset_nodes = []
-        x_offset = 0
-        for o in range(0, self.dag.sz):
-            nodes = []
-            for v, vct in self.dag.get_val_counts_by_offset(o):
-                if visible_nodes is None or (o, v) in visible_nodes:
-                    nodes.append(Node(o, v, vct))
-            nodes = self.draw_nodes_on_canvas(nodes, x_offset, o)
-            if o != 0:
-                edges = self.dag.get_edge_counts_by_offsets(o - 1, o)
-                self.draw_edges_on_canvas(prev_offset_nodes, nodes, edges, o, visible_nodes)
-            x_offset += self.xpad * 2
-            prev_offset_nodes = nodes
+                text_fill = theme["node_text_light"] if node.val == 0x00 else theme["node_text"]
+                for dy, text in svg_label_lines(label, font_size):
+                    write(f'  <text x="{text_x:.1f}" y="{text_y + dy:.1f}" fill="{text_fill}" {text_attrs}>{text}</text>\n')
+        write("</svg>\n")
+
+
+def write_merged_edges(write, column_edges, theme=THEME):
+    """Write one column pair's edges as a <path> per count-weighted stroke width."""
+    if not column_edges:
+        return
+    max_ct = max(ct for _, _, ct in column_edges)
+    by_width = {}
+    for _, (x1, y1, x2, y2), ct in column_edges:
+        width = 1 + round((SVG_MAX_EDGE_WIDTH - 1) * ct / max_ct)
+        by_width.setdefault(width, []).append(f"M{x1:.1f} {y1:.1f}L{x2:.1f} {y2:.1f}")
+    for width in sorted(by_width):
+        write(f'  <path d="{"".join(by_width[width])}" fill="none" stroke="{theme["node_text"]}" stroke-width="{width}" stroke-linecap="round"/>\n')
+
+
+def write_counts_json(dag: Dag, filepath: str):
+    """Dump per-offset value counts and transition counts (to the next offset) as JSON."""
+    import json
+    offsets = []
+    for o in range(dag.sz):
+        offsets.append({
+            "offset": dag.byte_offset(o),
+            "counts": dag.get_val_counts_by_offset(o),  # tuples encode as JSON arrays
+            "transitions": dag.get_edge_counts_by_offsets(o, o + 1) if o < dag.sz - 1 else [],
+        })
+    # json.dump writes through the pure-Python encoder; dumps encodes in C and writes once
+    text = json.dumps({"sz": dag.sz, "width": dag.width, "start": dag.offset, "rows": dag.index.rows, "offsets": offsets})
+    with open(filepath, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def write_counts_csv(dag: Dag, filepath: str):
+    import csv
+    with open(filepath, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["offset", "value", "count"])
+        for o in range(dag.sz):
+            for v, ct in dag.get_val_counts_by_offset(o):
+                w.writerow([dag.byte_offset(o), "" if v is None else v, ct])
+
+
+def write_transitions_csv(dag: Dag, filepath: str):
+    import csv
+    with open(filepath, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["offset", "value", "next_value", "count"])
+        for o in range(dag.sz - 1):
+            for src, dst, ct in dag.get_edge_counts_by_offsets(o, o + 1):
+                w.writerow([dag.byte_offset(o), "" if src is None else src, "" if dst is None else dst, ct])
+
+
+def write_stats_csv(dag: Dag, filepath: str):
+    import csv
+    with open(filepath, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["offset", "kind", "entropy", "distinct", "counter", "mi_next"])
+        for st in dag.offset_stats():
+            counter = "" if st["counter"] is None else int(st["counter"])
+            mi = "" if st["mi_next"] is None else f"{st['mi_next']:.4f}"
+            w.writerow([st["offset"], st["kind"], f"{st['entropy']:.4f}", st["distinct"], counter, mi])
+
+
+def print_clusters(dag: Dag, clusters: list[tuple[frozenset, int]]):
+    print(f"{'cluster':>7} {'samples':>12}  signature")
+    for k, (seeds, n) in enumerate(clusters, 1):
+        print(f"{k:>7} {n:>12,}  {dag.seed_signature(seeds)}")
+
+
+def write_diff_csv(dag: Dag, filepath: str):
+    """Per offset and value: the count in every corpus, the change against the first and the offset's distance."""
+    import csv
+    delta, ratio = DiffDag(dag, "delta"), DiffDag(dag, "ratio")
+    rows = delta.rows()
+    with open(filepath, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["offset", "value"] + [f"count_{label}" for label in dag.corpus_labels] + ["delta", "log2_ratio", "distance"])
+        for o in range(dag.sz):
+            corpus_counts = dag.corpus_counts(o)
+            distance = f"{delta.distance(corpus_counts, *rows):.6f}"
+            for v, cts in sorted(corpus_counts.items(), key=lambda r: (r[0] is not None, r[0] or 0)):
+                w.writerow([dag.byte_offset(o), "" if v is None else v, *cts, f"{delta.change(cts, *rows):.6f}", f"{ratio.change(cts, *rows):.4f}", distance])
+
+
+def matched(dag: Dag, seeds: set[tuple[int, int]]) -> Dag:
+    """dag, or its MatchedDag when there are seeds to match."""
+    if not seeds:
+        return dag
+    view = MatchedDag(dag, seeds)
+    print(f"{view.index.rows:,} of {dag.index.rows:,} samples match", file=sys.stderr)
+    return view
+
+
+def export(dag: Dag, args, timer: StageTimer):
+    """Write the exports requested on the command line."""
+    if args.svg:
+        view = dag
+        if args.simplify:
+            view = SimplifiedDag(dag, args.bucket_distinct, args.min_edge)
+        elif args.diff:
+            view = DiffDag(dag, args.diff, args.diff_size, args.diff_only)
+        with timer("layout"):
+            layout = LayoutEngine(view).layout()
+        with timer("svg"):
+            write_svg(layout, args.svg, merge_edges=args.svg_merge_edges, reuse_labels=args.svg_reuse_labels)
+    if args.json:
+        with timer("json"):
+            write_counts_json(dag, args.json)
+    if args.counts_csv:
+        with timer("counts-csv"):
+            write_counts_csv(dag, args.counts_csv)
+    if args.transitions_csv:
+        with timer("transitions-csv"):
+            write_transitions_csv(dag, args.transitions_csv)
+    if args.stats_csv:
+        with timer("stats-csv"):
+            write_stats_csv(dag, args.stats_csv)
+    if args.diff_csv:
+        with timer("diff-csv"):
+            write_diff_csv(dag, args.diff_csv)
+
+
+def write_profile(prefix: str, timer: StageTimer, profiler, dag: Dag | None):
+    """Save --profile output: PREFIX.json with the stage timings, PREFIX.prof with the cProfile stats."""
+    import json
+    import pstats
+
+    profiler.dump_stats(prefix + ".prof")
+    with open(prefix + ".json", "w") as f:
+        json.dump({"rows": dag.index.rows if dag else 0, "sz": dag.sz if dag else 0, "stages": timer.times}, f, indent=1)
+    timer.report()
+    pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(20)
+    print(f"Profile written to {prefix}.prof and {prefix}.json", file=sys.stderr)
+
+
+def match_seed(spec: str) -> tuple[int, int]:
+    pos, _, value = spec.partition(":")
+    pos, value = int(pos), int(value, 16)
+    if pos < 0 or not 0 <= value <= 0xFF:
+        raise ValueError(spec)
+    return pos, value
+
+
+def corpus_source(spec: str) -> tuple[str, str]:
+    label, sep, path = spec.partition("=")
+    if not sep or not label or not path:
+        raise ValueError(spec)
+    return label, path
+
+
+def header_length_field(spec: str) -> tuple[int, int]:
+    at, _, width = spec.partition(":")
+    at, width = int(at), int(width)
+    if at < 0 or width <= 0:
+        raise ValueError(spec)
+    return at, width
 
 
 def main():
+    import argparse
+    import re
     parser = argparse.ArgumentParser()
-    parser.add_argument("fmt", help="input format data [hex, file]", default="hex")
+    parser.add_argument("fmt", choices=SampleParser.FORMATS, default="hex", metavar="fmt",
+                        help="input format: lines of hex, file paths or base64, or a binary stream of pcap/pcapng packets or length-prefixed records [hex]")
     parser.add_argument("sz", help="size of DAG [8]", default=8)
+    parser.add_argument("--storage", choices=sorted(STORAGE_BACKENDS), default="sqlite", help="sample matrix storage engine, 'none' keeps only counts [sqlite]")
+    parser.add_argument("--offset", type=int, default=0, metavar="START", help="graph sz bytes starting at this offset of each sample [0]")
+    parser.add_argument("--width", type=int, choices=(1, 2, 4), default=1, help="bytes per field: each offset of the DAG is a 1, 2 or 4-byte word, sz counts words [1]")
+    parser.add_argument("--endian", choices=("big", "little"), default="big", help="byte order of multi-byte fields [big]")
+    parser.add_argument("--top", type=int, default=64, metavar="K", help="multi-byte fields: track about K frequent values per offset, the rest form an 'other' node [64]")
+    parser.add_argument("--anchor", action="append", type=bytes.fromhex, default=[], metavar="HEX", help="start each sample at the first occurrence of these bytes, or of any of them if repeated; --offset is then relative to it")
+    parser.add_argument("--anchor-regex", metavar="RE", help="like --anchor, at the first match of this bytes regex (characters up to \\xff stand for one byte, write others as \\xNN escapes)")
+    parser.add_argument("--header-length", type=header_length_field, metavar="AT:WIDTH", help="then skip a header whose length is the big-endian WIDTH-byte integer AT bytes into it")
+    parser.add_argument("--mmap", action="store_true", help="file format: map each file and count its window without storing samples (implies --storage none)")
+    parser.add_argument("--payload", action="store_true", help="pcap format: start each packet at its TCP/UDP payload (Ethernet, Linux cooked or raw IP captures), skipping other packets")
+    parser.add_argument("--record-prefix", type=int, choices=(1, 2, 4, 8), default=4, metavar="WIDTH", help="records format: bytes of the length before each record [4]")
+    parser.add_argument("--record-endian", choices=("big", "little"), default="big", help="records format: byte order of the length [big]")
+    parser.add_argument("--jobs", type=int, default=1, metavar="N", help="parse and count input in N worker processes, 0 for one per CPU [1]")
+    parser.add_argument("--cache", metavar="DIR", help="reuse the analysis of identical input from (and save it to) this directory")
+    policies = parser.add_mutually_exclusive_group()
+    policies.add_argument("--window", type=int, metavar="N", help="count only the last N samples, in constant memory (replaces --storage)")
+    policies.add_argument("--reservoir", type=int, metavar="N", help="count a uniform random sample of N of the input samples, in constant memory (replaces --storage)")
+    parser.add_argument("--corpus", action="append", type=corpus_source, default=[], metavar="LABEL=PATH",
+                        help="read input from PATH instead of stdin, counted separately under LABEL; repeat to compare corpora against the first")
+    parser.add_argument("--diff", choices=DiffDag.MEASURES, help="color nodes by how much more or less common they are in the other corpora than in the first: share difference or log2 ratio (SVG and window)")
+    parser.add_argument("--diff-size", action="store_true", help="--diff: size nodes by their change instead of their count")
+    parser.add_argument("--diff-only", type=float, metavar="D", help="--diff: only draw offsets whose value distributions differ by at least D (total variation distance, 0-1)")
+    parser.add_argument("--live", action="store_true", help="open the window right away and update it while stdin is still being read")
+    parser.add_argument("--refresh", type=int, default=250, metavar="MS", help="--live: redraw at most every MS milliseconds [250]")
+    parser.add_argument("--headless", action="store_true", help="write the exports below and exit without opening a window")
+    parser.add_argument("--svg", metavar="PATH", help="export the DAG as SVG, gzip-compressed if PATH ends in .svgz")
+    parser.add_argument("--svg-merge-edges", action="store_true", help="draw each column pair's edges as a few paths, stroke width by count")
+    parser.add_argument("--svg-reuse-labels", action="store_true", help="define each distinct label once and reference it from every node")
+    parser.add_argument("--simplify", action="store_true", help="draw runs of constant offsets as one node, bucket busy byte offsets into value classes and drop rare edges (SVG and window)")
+    parser.add_argument("--bucket-distinct", type=int, default=64, metavar="N", help="--simplify: bucket byte offsets with at least N distinct values [64]")
+    parser.add_argument("--min-edge", type=int, default=1, metavar="N", help="--simplify: drop edges seen fewer than N times [1]")
+    parser.add_argument("--match", action="append", type=match_seed, default=[], metavar="POS:HEX",
+                        help="keep only the samples with byte HEX at position POS, or any of the bytes given for POS if repeated; exports and the window (Exact filter) show the matching samples")
+    parser.add_argument("--clusters", action="store_true", help="list the groups of samples that share values at structural offsets (e.g. message types), largest first")
+    parser.add_argument("--cluster", type=int, metavar="K", help="keep only the samples of the K-th cluster of --clusters, like --match with its signature")
+    parser.add_argument("--cluster-depth", type=int, default=16, metavar="N", help="cluster on the first N offsets [16]")
+    parser.add_argument("--profile", metavar="PREFIX", help="time each stage of the run and profile it, writing PREFIX.json and PREFIX.prof (cProfile, for python -m pstats)")
+    parser.add_argument("--json", metavar="PATH", help="export value and transition counts per offset as JSON")
+    parser.add_argument("--counts-csv", metavar="PATH", help="export value counts per offset as CSV")
+    parser.add_argument("--transitions-csv", metavar="PATH", help="export transition counts per offset as CSV")
+    parser.add_argument("--diff-csv", metavar="PATH", help="export each value's count per corpus and its change against the first corpus as CSV")
+    parser.add_argument("--stats-csv", metavar="PATH", help="export entropy, distinct values, field kind and mutual information per offset as CSV")
     args = parser.parse_args()
-    if int(args.sz) > 1999:
-        print(f"Size limit 1999 exceeded.", file=sys.stderr)
+    if args.headless and not (args.svg or args.json or args.counts_csv or args.transitions_csv or args.stats_csv or args.diff_csv or args.clusters):
+        parser.error("--headless needs at least one of --svg, --json, --counts-csv, --transitions-csv, --stats-csv, --diff-csv, --clusters")
+    if args.mmap and args.fmt != "file":
+        parser.error("--mmap only applies to the file format")
+    if args.payload and args.fmt != "pcap":
+        parser.error("--payload only applies to the pcap format")
+    if args.offset < 0:
+        parser.error("--offset must not be negative")
+    if args.jobs < 0:
+        parser.error("--jobs must not be negative")
+    if args.live and (args.headless or args.cache or args.jobs != 1):
+        parser.error("--live cannot be combined with --headless, --cache or --jobs")
+    if args.live and args.fmt in SampleParser.BINARY_FORMATS:
+        parser.error("--live only reads text formats")
+    if args.refresh <= 0:
+        parser.error("--refresh must be positive")
+    policy, limit = None, 0
+    if args.window is not None:
+        policy, limit = "window", args.window
+    elif args.reservoir is not None:
+        policy, limit = "reservoir", args.reservoir
+    if policy and limit <= 0:
+        parser.error(f"--{policy} must be positive")
+    if policy and args.jobs != 1:
+        parser.error(f"--{policy} cannot be combined with --jobs")
+    if args.width > 1 and policy:
+        parser.error(f"--{policy} cannot be combined with --width")
+    if args.width > 1 and args.jobs != 1:
+        parser.error("--jobs cannot be combined with --width")
+    if args.top <= 0:
+        parser.error("--top must be positive")
+    if args.bucket_distinct <= 0 or args.min_edge <= 0:
+        parser.error("--bucket-distinct and --min-edge must be positive")
+    if (args.diff or args.diff_csv) and len(args.corpus) < 2:
+        parser.error("--diff and --diff-csv need at least two --corpus inputs")
+    if args.diff and args.simplify:
+        parser.error("--diff cannot be combined with --simplify")
+    if args.corpus and (args.live or args.cache or policy):
+        parser.error("--corpus cannot be combined with --live, --cache, --window or --reservoir")
+    if len({label for label, _ in args.corpus}) < len(args.corpus):
+        parser.error("--corpus labels must be unique")
+    stored = not (args.width > 1 or args.mmap or (args.storage == "none" and not policy))
+    if (args.match or args.clusters or args.cluster) and not stored:
+        parser.error("--match and clustering need the stored samples: --storage sqlite or array, or --window/--reservoir, without --width or --mmap")
+    if (args.cluster is not None and args.cluster <= 0) or args.cluster_depth <= 0:
+        parser.error("--cluster and --cluster-depth must be positive")
+    if (args.clusters or args.cluster) and args.live:
+        parser.error("--clusters and --cluster cannot be combined with --live")
+    jobs = args.jobs or os.cpu_count() or 1
+    aligner = None
+    if args.anchor or args.anchor_regex or args.header_length:
+        try:
+            aligner = Aligner(args.anchor, args.anchor_regex, args.header_length)
+        except re.error as e:
+            parser.error(f"--anchor-regex: {e}")
+        except UnicodeEncodeError as e:
+            parser.error(f"--anchor-regex matches bytes, write {e.object[e.start]!r} as \\xNN escapes of its encoding")
+    storage = "none" if args.mmap or policy or args.width > 1 else args.storage
+    sz = int(args.sz)
+    seeds = {(pos - args.offset, value) for pos, value in args.match}
+    if any(not 0 <= o < sz for o, _ in seeds):
+        parser.error(f"--match positions must lie between --offset and --offset + sz ({args.offset}..{args.offset + sz - 1})")
+    max_sz = getattr(STORAGE_BACKENDS[storage], "MAX_SZ", None)
+    if max_sz is not None and sz > max_sz:
+        print(f"Size limit {max_sz} exceeded, use --storage array for larger DAGs.", file=sys.stderr)
     else:
-        with sqlite3.connect(":memory:") as conn:
-            d = Dag(conn, fmt=args.fmt, sz=int(args.sz))
-            app = CanvasApp(d)
-            app.mainloop()
+        timer = StageTimer()
+        profiler = d = None
+        if args.profile:
+            import cProfile
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            with timer("ingest"):
+                d = Dag(None, fmt=args.fmt, sz=sz, storage=storage, offset=args.offset, use_mmap=args.mmap, jobs=jobs, cache_dir=args.cache, live=args.live, policy=policy, limit=limit, aligner=aligner,
+                        width=args.width, byteorder=args.endian, top=args.top, corpora=args.corpus, payload=args.payload, record_prefix=(args.record_prefix, args.record_endian))
+            if args.clusters or args.cluster:
+                with timer("cluster"):
+                    clusters = d.clusters(args.cluster_depth)
+                if args.clusters:
+                    print_clusters(d, clusters)
+                if args.cluster is not None:
+                    if args.cluster > len(clusters):
+                        parser.error(f"--cluster: there are only {len(clusters)} clusters")
+                    seeds |= clusters[args.cluster - 1][0]
+            if not args.live:
+                with timer("match"):
+                    view = matched(d, seeds)
+                export(view, args, timer)
+            if not args.headless:
+                from daguire_gui import CanvasApp
+                with timer("window"):
+                    app = CanvasApp(d, refresh_ms=args.refresh, simplify=args.simplify,
+                                    simplify_options={"bucket_distinct": args.bucket_distinct, "min_edge": args.min_edge},
+                                    exact=bool(seeds), seeds=seeds, diff=args.diff, diff_size=args.diff_size, diff_only=args.diff_only)
+                    app.mainloop()
+            if args.live:
+                # Export what was counted by the time the window was closed
+                with timer("match"):
+                    view = matched(d, seeds)
+                export(view, args, timer)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                write_profile(args.profile, timer, profiler, d)
 
 
 if __name__ == "__main__":
+    # Let daguire_gui's "import daguire" reuse this module instead of loading a second copy
+    sys.modules.setdefault("daguire", sys.modules["__main__"])
     main()
@@ -0,0 +1,696 @@
+"""Tk canvas UI for daguire, imported only when a window is opened."""
+import sys
+import time
+import tkinter as tk
+from tkinter import ttk
+from tkinter.filedialog import asksaveasfilename
+
+from daguire import THEME, Dag, DiffDag, LayoutEngine, MatchedDag, SimplifiedDag, format_byte_label, heat_color, write_svg
+
+
+class CanvasApp(tk.Tk):
+    THEME = THEME
+
+    # While live input arrives, the heat strip follows the counts at most this often
+    LIVE_STATS_MS = 2000
+    # Simplified view defaults: also hide edges carrying less than 0.1% of the samples
+    SIMPLIFY_OPTIONS = {"bucket_distinct": 64, "min_edge": 1, "min_share": 0.001}
+    # "Differing offsets only" keeps offsets whose corpora are at least this far apart
+    DIFF_MIN_CHANGE = 0.01
+
+    def __init__(self, dag: Dag, refresh_ms: int = 250, simplify: bool = False, simplify_options: dict | None = None,
+                 exact: bool = False, seeds=(), diff: str | None = None, diff_size: bool = False, diff_only: float | None = None):
+        super().__init__()
+        self.dag = dag
+        self.refresh_ms = refresh_ms
+        self.xpad = 150
+        self.ypad = 150
+        self.theme = self.THEME.copy()
+        self.display_options = {"decimal": True, "hex": True, "binary": True, "ascii": True}
+        self.filter_seeds: set[tuple[int, int]] = set(seeds)  # (offset, value) — click to filter, Ctrl+click to add
+        # Exact filtering draws only the samples holding every seed, which needs the stored samples
+        self.exact_filter = tk.BooleanVar(value=exact and dag.records is not None)
+        self.collapse_columns = tk.BooleanVar(value=False)
+        self._collapsed = frozenset()
+        self._collapsed_from = None  # the offset_stats that _collapsed was found in
+        self.simplify = tk.BooleanVar(value=simplify)
+        self.simplify_options = {**self.SIMPLIFY_OPTIONS, **(simplify_options or {})}
+        self.diff = tk.StringVar(value=diff or "off")
+        self.diff_size = tk.BooleanVar(value=diff_size)
+        self.diff_only = tk.BooleanVar(value=diff_only is not None)
+        self.diff_min_change = self.DIFF_MIN_CHANGE if diff_only is None else diff_only
+        # Seeds of an exact filter under a simplified or compared view, which is then built on the
+        # matching samples; they are Dag offsets and values, unlike that view's own filter seeds
+        self.match_seeds = frozenset()
+        if self._view_mode() in ("simplify", "diff"):
+            self.match_seeds = frozenset(self.filter_seeds) if self.exact_filter.get() else frozenset()
+            self.filter_seeds = set()
+        self._set_view()
+
+        self.title("DAGUIRE")
+        self.configure(bg=self.theme["bg"])
+        if sys.platform == "win32":
+            self.state("zoomed")
+        else:
+            self.wm_attributes("-zoomed", 1)
+
+        self._setup_styles()
+        self._build_toolbar()
+        self.frame = tk.Frame(self, bg=self.theme["bg"])
+        self.frame.pack(fill="both", expand=True)
+        self.canvas = tk.Canvas(self.frame, bg=self.theme["canvas_bg"], highlightthickness=0)
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.canvas.bind("<MouseWheel>", self.on_mousewheel)
+        self.canvas.bind("<Button-4>", self.on_mousewheel)
+        self.canvas.bind("<Button-5>", self.on_mousewheel)
+        self.canvas.bind("<ButtonPress-1>", self.on_button_press)
+        self.canvas.bind("<B1-Motion>", self.pan_canvas)
+        self.canvas.bind("<ButtonRelease-1>", self.on_button_release)
+        self.canvas.bind("<Configure>", lambda event: self._schedule_viewport_sync())
+
+        # Canvas items per (offset, value) node and (offset, src, dst) edge, reused across redraws:
+        # node -> [shape, text or None, rect, label, shown], edge -> [line, coords, width, shown]
+        self._node_items: dict[tuple[int, int], list] = {}
+        self._edge_items: dict[tuple[int, int, int], list] = {}
+        # Heat strip above each column: offset -> [rect, text or None, coords, fill, label]
+        self._strip_items: dict[int, list] = {}
+        # Zoom accumulated since the items were created: canvas = layout * zoom + origin
+        self._zoom = 1.0
+        self._origin = (0.0, 0.0)
+        self._lod = False
+        self._viewport_pending = None
+        # (view, its offset_stats, when they were taken), see _offset_stats
+        self._stats = None
+
+        self.draw_dag()
+        if dag.live is not None:
+            self.after(self.refresh_ms, self._poll_live)
+
+    def _view_mode(self) -> str:
+        if self.simplify.get():
+            return "simplify"
+        if self.diff.get() != "off" and len(self.dag.corpus_indexes) > 1:
+            return "diff"
+        if self.exact_filter.get() and self.filter_seeds:
+            return "exact"
+        return "plain"
+
+    def _set_view(self):
+        """Draw the Dag, its SimplifiedDag, its DiffDag or, filtering exactly, the MatchedDag of the filter seeds.
+
+        Filtering exactly under a simplified or compared view, that view is built on the MatchedDag of match_seeds.
+        """
+        mode = self._view_mode()
+        self.matched = None
+        if mode in ("simplify", "diff") and self.exact_filter.get() and self.match_seeds:
+            self.matched = MatchedDag(self.dag, self.match_seeds)
+        base = self.dag if self.matched is None else self.matched
+        if mode == "simplify":
+            self.view = SimplifiedDag(base, **self.simplify_options)
+        elif mode == "diff":
+            self.view = DiffDag(base, self.diff.get(), self.diff_size.get(), self.diff_min_change if self.diff_only.get() else None)
+        elif mode == "exact":
+            self.view = self.matched = MatchedDag(self.dag, self.filter_seeds)
+        else:
+            self.view = self.dag
+        self.engine = LayoutEngine(self.view, col_height=self.winfo_screenheight() / 2, xpad=self.xpad, ypad=self.ypad)
+
+    def _on_view_changed(self, *args):
+        # Columns and node values differ between the views, so their filter seeds start from scratch;
+        # the Dag seeds of an exact filter carry over into a simplified or compared view and back
+        if not isinstance(self.view, (SimplifiedDag, DiffDag)):
+            self.match_seeds = frozenset(self.filter_seeds) if self.exact_filter.get() else frozenset()
+        self.filter_seeds = set() if self._view_mode() in ("simplify", "diff") else set(self.match_seeds)
+        self._set_view()
+        self._update_filter_bar()
+        self._clear_items()
+        self.draw_dag()
+
+    def _poll_live(self):
+        """Count what the live feed read since the last tick and redraw if anything arrived.
+
+        The next tick is scheduled only after this one is drawn, so a fast capture
+        lowers the frame rate instead of queueing redraws behind user input.
+        """
+        if self.dag.ingest_pending():
+            self.title(f"DAGUIRE ({self.dag.index.rows:,} rows)")
+            self.redraw_dag()
+        if not self.dag.live.finished:
+            self.after(self.refresh_ms, self._poll_live)
+        else:
+            self.draw_dag()  # the heat strip may lag behind the last rows counted, see _offset_stats
+
+    def _setup_styles(self):
+        style = ttk.Style()
+        style.theme_use("clam")
+        style.configure(
+            "Toolbar.TFrame",
+            background=self.theme["toolbar_bg"],
+        )
+        style.configure(
+            "Toolbar.TCheckbutton",
+            background=self.theme["toolbar_bg"],
+            foreground=self.theme["toolbar_fg"],
+            font=self.theme["font"],
+        )
+        style.configure(
+            "Toolbar.TButton",
+            background=self.theme["toolbar_bg"],
+            foreground=self.theme["toolbar_fg"],
+            font=self.theme["font"],
+        )
+        style.map("Toolbar.TButton", background=[("active", self.theme["accent"])])
+        style.configure(
+            "Toolbar.TLabel",
+            background=self.theme["toolbar_bg"],
+            foreground=self.theme["toolbar_fg"],
+            font=self.theme["font"],
+        )
+
+    def _build_toolbar(self):
+        toolbar = ttk.Frame(self, style="Toolbar.TFrame", padding=(10, 8))
+        toolbar.pack(fill="x")
+
+        ttk.Button(toolbar, text="Save as SVG…", style="Toolbar.TButton", command=self.save_canvas_as_svg).pack(side="left", padx=(0, 16))
+        ttk.Button(toolbar, text="Save as PS…", style="Toolbar.TButton", command=self.save_canvas_as_ps).pack(side="left", padx=(0, 16))
+        ttk.Button(toolbar, text="Fit to Canvas", style="Toolbar.TButton", command=self.fit_to_canvas).pack(side="left", padx=(0, 16))
+
+        sep = tk.Frame(toolbar, width=1, bg=self.theme["node_outline"])
+        sep.pack(side="left", fill="y", padx=8, pady=2)
+
+        label = ttk.Label(toolbar, text="Node label:", style="Toolbar.TLabel")
+        label.pack(side="left", padx=(0, 6))
+        for key, label_text in [("decimal", "Dec"), ("hex", "Hex"), ("binary", "Bin"), ("ascii", "ASCII")]:
+            var = tk.BooleanVar(value=self.display_options[key])
+            var.trace_add("write", self._on_display_option_changed)
+            self.display_options[f"_var_{key}"] = var
+            cb = ttk.Checkbutton(toolbar, text=label_text, variable=var, style="Toolbar.TCheckbutton")
+            cb.pack(side="left", padx=2)
+
+        sep = tk.Frame(toolbar, width=1, bg=self.theme["node_outline"])
+        sep.pack(side="left", fill="y", padx=8, pady=2)
+        self.collapse_columns.trace_add("write", lambda *args: self.redraw_dag())
+        ttk.Checkbutton(
+            toolbar, text="Collapse constant/random", variable=self.collapse_columns, style="Toolbar.TCheckbutton"
+        ).pack(side="left", padx=2)
+        self.simplify.trace_add("write", self._on_view_changed)
+        ttk.Checkbutton(toolbar, text="Simplify", variable=self.simplify, style="Toolbar.TCheckbutton").pack(side="left", padx=2)
+        self.exact_filter.trace_add("write", self._on_exact_changed)
+        exact = ttk.Checkbutton(toolbar, text="Exact filter", variable=self.exact_filter, style="Toolbar.TCheckbutton")
+        exact.pack(side="left", padx=2)
+        if self.dag.records is None:
+            exact.state(["disabled"])
+
+        # Filter bar (second row): shows filter seeds and Clear
+        self.filter_bar = ttk.Frame(self, style="Toolbar.TFrame", padding=(10, 4))
+        self.filter_bar.pack(fill="x")
+        self._filter_chips_frame = ttk.Frame(self.filter_bar, style="Toolbar.TFrame")
+        self._filter_chips_frame.pack(side="left", fill="x", expand=True)
+        self._filter_placeholder = ttk.Label(
+            self.filter_bar, text="Filter: click a node to show only downstream; Ctrl+click to add", style="Toolbar.TLabel"
+        )
+        self._filter_placeholder.pack(side="left")
+        self._match_label = ttk.Label(self.filter_bar, text="", style="Toolbar.TLabel")
+        self._match_label.pack(side="right")
+        self._clusters = []
+        if self.dag.records is not None:
+            # Clustered on first use, since it reads every stored sample
+            self._cluster_chooser = ttk.Combobox(self.filter_bar, state="readonly", width=40, postcommand=self._list_clusters)
+            self._cluster_chooser.bind("<<ComboboxSelected>>", lambda event: self._select_cluster(self._cluster_chooser.current()))
+            self._cluster_chooser.pack(side="right", padx=(0, 8))
+            ttk.Label(self.filter_bar, text="Cluster:", style="Toolbar.TLabel").pack(side="right", padx=(0, 4))
+        self._update_filter_bar()
+
+        # Comparison bar (third row), when there are corpora to compare
+        if len(self.dag.corpus_labels) < 2:
+            return
+        diff_bar = ttk.Frame(self, style="Toolbar.TFrame", padding=(10, 4))
+        diff_bar.pack(fill="x")
+        others = ", ".join(self.dag.corpus_labels[1:])
+        ttk.Label(diff_bar, text=f"Compare {others} against {self.dag.corpus_labels[0]}:", style="Toolbar.TLabel").pack(side="left", padx=(0, 6))
+        ttk.Combobox(diff_bar, textvariable=self.diff, values=("off",) + DiffDag.MEASURES, state="readonly", width=6).pack(side="left", padx=2)
+        for var, text in [(self.diff_size, "Size by change"), (self.diff_only, "Differing offsets only")]:
+            ttk.Checkbutton(diff_bar, text=text, variable=var, style="Toolbar.TCheckbutton").pack(side="left", padx=2)
+        for var in (self.diff, self.diff_size, self.diff_only):
+            var.trace_add("write", self._on_view_changed)
+
+    def _list_clusters(self):
+        self._clusters = self.dag.clusters()
+        self._cluster_chooser.configure(values=[f"{n:,}  {self.dag.seed_signature(seeds)}" for seeds, n in self._clusters])
+
+    def _select_cluster(self, k: int):
+        """Show only the samples of the k-th cluster: its signature becomes an exact filter."""
+        if not 0 <= k < len(self._clusters):
+            return
+        # Cluster seeds are offsets and values of the Dag itself
+        self.simplify.set(False)
+        self.diff.set("off")
+        self.filter_seeds = set(self._clusters[k][0])
+        self._update_filter_bar()
+        self.exact_filter.set(True)
+
+    def _update_filter_bar(self):
+        for w in self._filter_chips_frame.winfo_children():
+            w.destroy()
+        if not self.filter_seeds:
+            self._filter_placeholder.pack(side="left")
+            return
+        self._filter_placeholder.pack_forget()
+        ttk.Label(self._filter_chips_frame, text="Filter:", style="Toolbar.TLabel").pack(side="left", padx=(0, 6))
+        for (offset, val) in sorted(self.filter_seeds):
+            chip = ttk.Frame(self._filter_chips_frame, style="Toolbar.TFrame")
+            chip.pack(side="left", padx=2)
+            value = self.view.value_name(offset, val) or format_byte_label(val, {"decimal": False, "binary": False, "ascii": False}, self.dag.width)
+            value = value.split("\n")[0]
+            lbl = ttk.Label(chip, text=f"{value} @ {self.view.byte_offset(offset)}", style="Toolbar.TLabel")
+            lbl.pack(side="left", padx=(4, 2), pady=2)
+            btn = ttk.Button(chip, text="×", style="Toolbar.TButton", width=2, command=lambda o=offset, v=val: self._remove_filter_seed(o, v))
+            btn.pack(side="left", padx=(0, 4), pady=2)
+        ttk.Button(self._filter_chips_frame, text="Clear", style="Toolbar.TButton", command=self._clear_filter).pack(side="left", padx=(8, 0))
+
+    def _remove_filter_seed(self, offset: int, val: int):
+        self.filter_seeds.discard((offset, val))
+        self._update_filter_bar()
+        self.redraw_dag()
+
+    def _clear_filter(self):
+        self.filter_seeds.clear()
+        self._update_filter_bar()
+        self.redraw_dag()
+
+    def _on_display_option_changed(self, *args):
+        for k in ("decimal", "hex", "binary", "ascii"):
+            var = self.display_options.get(f"_var_{k}")
+            if isinstance(var, tk.BooleanVar):
+                self.display_options[k] = var.get()
+        self.update_labels()
+
+    def _on_exact_changed(self, *args):
+        if self._view_mode() in ("simplify", "diff"):
+            if self.match_seeds:
+                self._on_view_changed()  # the view is built on other samples
+        else:
+            self.redraw_dag()
+
+    def redraw_dag(self):
+        if self.matched is not None or self._view_mode() == "exact":
+            self._set_view()  # the matched samples change with the seeds and the input
+        self.draw_dag()
+
+    def update_labels(self):
+        """Rewrite node labels in place after a display option changed."""
+        for (offset, val), item in self._node_items.items():
+            label = self._layout.label(offset, val, self.display_options)
+            if label != item[3] and item[1] is not None:
+                self.canvas.itemconfigure(item[1], text=label)
+                item[3] = label
+
+    def save_canvas_as_svg(self):
+        filepath = asksaveasfilename(defaultextension=".svg", filetypes=[("SVG files", "*.svg"), ("Compressed SVG files", "*.svgz"), ("All Files", "*.*")])
+        if not filepath:
+            return
+        self._write_svg(filepath)
+
+    def save_canvas_as_ps(self):
+        filepath = asksaveasfilename(defaultextension=".eps", filetypes=[("PostScript files", "*.eps"), ("All Files", "*.*")])
+        if not filepath:
+            return
+        self.update()
+        self.canvas.postscript(file=filepath, colormode='color')
+
+    def _write_svg(self, filepath: str):
+        """Export current DAG view to lossless SVG using the same layout as the canvas."""
+        write_svg(self.engine.layout(self.filter_seeds, self._collapsed), filepath, self.theme, self.display_options)
+
+    def _content_bbox(self) -> tuple:
+        """Layout extent including the heat strip above the columns."""
+        x1, y1, x2, y2 = self._layout.bbox
+        return (x1, y1 - self.STRIP_GAP - self.STRIP_HEIGHT, x2, y2)
+
+    def fit_to_canvas(self):
+        self.canvas.update_idletasks()
+        # Only the columns in view have items, so fit the whole layout rather than bbox("all")
+        bbox = self._to_canvas(*self._content_bbox()) if self.view.sz else None
+        if not bbox:
+            return
+        cw = self.canvas.winfo_width()
+        ch = self.canvas.winfo_height()
+        if cw <= 1 or ch <= 1:
+            return
+        content_w = bbox[2] - bbox[0]
+        content_h = bbox[3] - bbox[1]
+        if content_w <= 0 or content_h <= 0:
+            return
+        margin = 0.9
+        scale = min(cw / content_w, ch / content_h) * margin
+        cx = (bbox[0] + bbox[2]) / 2
+        cy = (bbox[1] + bbox[3]) / 2
+        self._scale_view(cx, cy, scale)
+        bbox2 = self._to_canvas(*self._content_bbox())
+        self.canvas.configure(scrollregion=bbox2)
+        sw = bbox2[2] - bbox2[0]
+        sh = bbox2[3] - bbox2[1]
+        center_x = (bbox2[0] + bbox2[2]) / 2
+        center_y = (bbox2[1] + bbox2[3]) / 2
+        fx = max(0, min(1, (center_x - cw / 2) / sw)) if sw > 0 else 0
+        fy = max(0, min(1, (center_y - ch / 2) / sh)) if sh > 0 else 0
+        self.canvas.xview_moveto(fx)
+        self.canvas.yview_moveto(fy)
+
+    def on_mousewheel(self, event):
+        if event.delta > 0 or event.num == 4:
+            scale_factor = 1.1
+        else:
+            scale_factor = 0.9
+        x = self.canvas.canvasx(event.x)
+        y = self.canvas.canvasy(event.y)
+        self._scale_view(x, y, scale_factor)
+
+    def _scale_view(self, x, y, factor):
+        self.canvas.scale("all", x, y, factor, factor)
+        ox, oy = self._origin
+        self._origin = (x + (ox - x) * factor, y + (oy - y) * factor)
+        self._zoom *= factor
+        self._schedule_viewport_sync()
+
+    def _to_canvas(self, *coords) -> list[float]:
+        """Map layout coordinates (x, y, x, y, ...) to the canvas through the current zoom."""
+        z, (ox, oy) = self._zoom, self._origin
+        return [c * z + (oy if i % 2 else ox) for i, c in enumerate(coords)]
+
+    # Pan sensitivity: Tk multiplies scan delta by 10, so we scale coords for 1:1 feel
+    PAN_GAIN = 0.1
+
+    def on_button_press(self, event):
+        self._pan_start = (event.x, event.y)
+        self.canvas.scan_mark(event.x, event.y)
+
+    def pan_canvas(self, event):
+        sx, sy = self._pan_start
+        # Pass coords so effective delta is (dx, dy) * PAN_GAIN; Tk then *10 → 1:1
+        # scan_dragto requires integers
+        x = int(sx + (event.x - sx) * self.PAN_GAIN)
+        y = int(sy + (event.y - sy) * self.PAN_GAIN)
+        self.canvas.scan_dragto(x, y)
+        self._schedule_viewport_sync()
+
+    _CLICK_THRESHOLD = 5
+
+    def on_button_release(self, event):
+        dx = abs(event.x - self._pan_start[0])
+        dy = abs(event.y - self._pan_start[1])
+        if dx > self._CLICK_THRESHOLD or dy > self._CLICK_THRESHOLD:
+            return  # was a pan, not a click
+        cx = self.canvas.canvasx(event.x)
+        cy = self.canvas.canvasy(event.y)
+        items = self.canvas.find_overlapping(cx, cy, cx, cy)
+        for iid in reversed(items):
+            tags = self.canvas.gettags(iid)
+            for t in tags:
+                if t.startswith("node_") and t != "node":
+                    parts = t.split("_")
+                    if len(parts) == 3:
+                        try:
+                            offset, val = int(parts[1]), int(parts[2])
+                            # Always add clicked node to filter (Ctrl or not); use Clear to reset
+                            self.filter_seeds.add((offset, val))
+                            self._update_filter_bar()
+                            self.redraw_dag()
+                        except ValueError:
+                            pass
+                    return
+
+    @staticmethod
+    def round_rectangle_points(x1, y1, x2, y2, r=25):
+        return (
+            x1 + r,
+            y1,
+            x1 + r,
+            y1,
+            x2 - r,
+            y1,
+            x2 - r,
+            y1,
+            x2,
+            y1,
+            x2,
+            y1 + r,
+            x2,
+            y1 + r,
+            x2,
+            y2 - r,
+            x2,
+            y2 - r,
+            x2,
+            y2,
+            x2 - r,
+            y2,
+            x2 - r,
+            y2,
+            x1 + r,
+            y2,
+            x1 + r,
+            y2,
+            x1,
+            y2,
+            x1,
+            y2 - r,
+            x1,
+            y2 - r,
+            x1,
+            y1 + r,
+            x1,
+            y1 + r,
+            x1,
+            y1,
+        )
+
+    def create_round_rectangle(self, x1, y1, x2, y2, r=25, tags=(), **kwargs):
+        """Create a rounded rectangle given in layout coordinates."""
+        if "tags" in kwargs:
+            tags = kwargs.pop("tags")
+        points = self._to_canvas(*self.round_rectangle_points(x1, y1, x2, y2, r))
+        return self.canvas.create_polygon(points, tags=tags, **kwargs, smooth=True)
+
+    def _sync_node(self, node, rect, tags):
+        """Create the node's items, or move/relabel/show the ones from an earlier draw."""
+        key = (node.offset, node.val)
+        self._drawn_nodes.add(key)
+        x1, y1, x2, y2 = rect
+        label = self._layout.label(node.offset, node.val, self.display_options)
+        item = self._node_items.get(key)
+        if item is None:
+            style = dict(fill=node.color, outline=self.theme["node_outline"], width=self.theme["node_outline_width"], tags=tags)
+            if self._lod:
+                self._node_items[key] = [self.canvas.create_rectangle(*self._to_canvas(*rect), **style), None, rect, label, True]
+                return
+            poly = self.create_round_rectangle(x1, y1, x2, y2, self.engine.NODE_RADIUS, **style)
+            text_fill = self.theme["node_text_light"] if node.val == 0x00 else self.theme["node_text"]
+            text = self.canvas.create_text(
+                *self._to_canvas((x1 + x2) / 2, (y1 + y2) / 2), text=label, fill=text_fill, anchor=tk.CENTER, font=self.theme["font"], tags=tags
+            )
+            self._node_items[key] = [poly, text, rect, label, True]
+            return
+        shape, text, old_rect, old_label, shown = item
+        if rect != old_rect:
+            points = rect if self._lod else self.round_rectangle_points(x1, y1, x2, y2, self.engine.NODE_RADIUS)
+            self.canvas.coords(shape, *self._to_canvas(*points))
+            if text is not None:
+                self.canvas.coords(text, *self._to_canvas((x1 + x2) / 2, (y1 + y2) / 2))
+        if label != old_label and text is not None:
+            self.canvas.itemconfigure(text, text=label)
+        if not shown:
+            self.canvas.itemconfigure(shape, state="normal")
+            if text is not None:
+                self.canvas.itemconfigure(text, state="normal")
+        item[2:] = [rect, label, True]
+
+    def _sync_edge(self, key, coords, width):
+        self._drawn_edges.add(key)
+        item = self._edge_items.get(key)
+        if item is None:
+            if self._lod:
+                line = self.canvas.create_line(*self._to_canvas(*coords), fill=self.theme["node_text"], width=width)
+            else:
+                line = self.canvas.create_line(
+                    *self._to_canvas(*coords),
+                    fill=self.theme["node_text"],
+                    width=width,
+                    smooth=True,
+                    arrow=tk.LAST,
+                )
+            self._edge_items[key] = [line, coords, width, True]
+            return
+        line, old_coords, old_width, shown = item
+        if coords != old_coords:
+            self.canvas.coords(line, *self._to_canvas(*coords))
+        if width != old_width:
+            self.canvas.itemconfigure(line, width=width)
+        if not shown:
+            self.canvas.itemconfigure(line, state="normal")
+        item[1:] = [coords, width, True]
+
+    def _prune_items(self, columns: range):
+        """Delete items of columns outside `columns`; hide those in it that the last pass did not draw."""
+        for key in list(self._node_items):
+            item = self._node_items[key]
+            if key[0] not in columns:
+                self.canvas.delete(*(i for i in item[:2] if i is not None))
+                del self._node_items[key]
+            elif item[4] and key not in self._drawn_nodes:
+                for i in item[:2]:
+                    if i is not None:
+                        self.canvas.itemconfigure(i, state="hidden")
+                item[4] = False
+        for offset in [o for o in self._strip_items if o not in columns]:
+            self.canvas.delete(*(i for i in self._strip_items.pop(offset)[:2] if i is not None))
+        for key in list(self._edge_items):
+            item = self._edge_items[key]
+            # Merged LOD edges change with every zoom step, so stale ones are not worth keeping
+            if key[0] not in columns or (self._lod and key not in self._drawn_edges):
+                self.canvas.delete(item[0])
+                del self._edge_items[key]
+            elif item[3] and key not in self._drawn_edges:
+                self.canvas.itemconfigure(item[0], state="hidden")
+                item[3] = False
+
+    def _clear_items(self):
+        for item in self._node_items.values():
+            self.canvas.delete(*(i for i in item[:2] if i is not None))
+        for item in self._edge_items.values():
+            self.canvas.delete(item[0])
+        for item in self._strip_items.values():
+            self.canvas.delete(*(i for i in item[:2] if i is not None))
+        self._node_items.clear()
+        self._edge_items.clear()
+        self._strip_items.clear()
+
+    # Heat strip size and distance above the columns, in layout coordinates
+    STRIP_HEIGHT = 40
+    STRIP_GAP = 20
+
+    def _sync_strip(self, offset: int, stats: dict):
+        """(Re)create the heat strip cell of a column when its place, color or label changed."""
+        layout = self._layout
+        x1 = layout.column_x[offset]
+        narrow = offset in layout.collapsed
+        x2 = x1 + (self.engine.COLLAPSED_WIDTH if narrow else self.engine.NODE_WIDTH)
+        coords = (x1, -self.STRIP_GAP - self.STRIP_HEIGHT, x2, -self.STRIP_GAP)
+        # Compared corpora: the strip shows how far apart they are at each offset instead
+        distance = stats.get("distance")
+        fill = heat_color(stats["entropy"] / (8 * self.dag.width) if distance is None else distance)
+        if self._lod:
+            label = None
+        elif narrow:
+            label = stats["kind"][0].upper()
+        elif distance is not None:
+            label = f"{stats['kind']}  D={distance:.2f}"
+        else:
+            label = f"{stats['kind']}  H={stats['entropy']:.2f}"
+        item = self._strip_items.get(offset)
+        if item is not None:
+            if item[2:] == [coords, fill, label]:
+                return
+            self.canvas.delete(*(i for i in item[:2] if i is not None))
+        rect = self.canvas.create_rectangle(*self._to_canvas(*coords), fill=fill, outline="", tags=("strip",))
+        text = None
+        if label is not None:
+            text = self.canvas.create_text(
+                *self._to_canvas((x1 + x2) / 2, coords[1] + self.STRIP_HEIGHT / 2), text=label, fill=self.theme["node_text"], font=self.theme["font"], tags=("strip",)
+            )
+        self._strip_items[offset] = [rect, text, coords, fill, label]
+
+    def draw_nodes_on_canvas(self, offset: int):
+        for node in self._layout.columns[offset]:
+            self._sync_node(node, node.coordinates, ("node", f"node_{offset}_{node.val}"))
+
+    def draw_edges_on_canvas(self, offset: int):
+        edges = self._layout.edges[offset]
+        if not self._lod:
+            for key, coords, _ in edges:
+                self._sync_edge(key, coords, 2)
+            return
+        # Zoomed out: edges whose ends fall within the same few pixels become one straight
+        # line, drawn as wide as the number of samples it carries allows
+        bucket = self.LOD_EDGE_BUCKET / self._zoom
+        merged = {}
+        for key, coords, ct in edges:
+            group = (int(coords[1] // bucket), int(coords[3] // bucket))
+            if group in merged:
+                merged[group][2] += ct
+            else:
+                merged[group] = [key, coords, ct]
+        max_ct = max((ct for _, _, ct in merged.values()), default=1)
+        for key, coords, ct in merged.values():
+            self._sync_edge(key, coords, round(1 + (self.LOD_MAX_EDGE_WIDTH - 1) * ct / max_ct))
+
+    # Columns kept drawn beyond each side of the view, so short pans do not expose empty space
+    VIEWPORT_MARGIN = 2
+    # Below this zoom nodes are unlabeled plain rectangles and edges straight count-weighted lines
+    LOD_ZOOM = 0.4
+    LOD_MAX_EDGE_WIDTH = 8
+    LOD_EDGE_BUCKET = 4  # pixels
+
+    def _visible_columns(self) -> range:
+        if not self.view.sz:
+            return range(0)
+        cw = self.canvas.winfo_width()
+        if cw <= 1:  # not mapped yet
+            cw = self.winfo_screenwidth()
+        ox = self._origin[0]
+        x0 = (self.canvas.canvasx(0) - ox) / self._zoom
+        x1 = (self.canvas.canvasx(cw) - ox) / self._zoom
+        first = max(0, self._layout.column_at(x0) - self.VIEWPORT_MARGIN)
+        last = min(self.view.sz - 1, self._layout.column_at(x1) + self.VIEWPORT_MARGIN)
+        return range(first, last + 1)
+
+    def _schedule_viewport_sync(self):
+        if self._viewport_pending is None:
+            self._viewport_pending = self.after_idle(self._sync_viewport)
+
+    def _offset_stats(self):
+        """The view's offset_stats, taken again at most every LIVE_STATS_MS while live input arrives.
+
+        They are analyzed per offset as they are looked up, so a draw only pays for the
+        columns in view; live ticks would otherwise analyze those again every time.
+        """
+        now = time.monotonic()
+        live = self.dag.live is not None and not self.dag.live.finished
+        stats = self._stats
+        if stats is None or stats[0] is not self.view or len(stats[1]) != self.view.sz or not live or now - stats[2] >= self.LIVE_STATS_MS / 1000:
+            stats = self._stats = (self.view, self.view.offset_stats(), now)
+        return stats[1]
+
+    def _sync_viewport(self):
+        """Create, update, hide or delete items so that exactly the columns in view are drawn."""
+        self._viewport_pending = None
+        lod = self._zoom < self.LOD_ZOOM
+        if lod != self._lod:
+            self._clear_items()
+            self._lod = lod
+        columns = self._visible_columns()
+        self._drawn_nodes = set()
+        self._drawn_edges = set()
+        stats = self._offset_stats()
+        for o in columns:
+            self._sync_strip(o, stats[o])
+            self.draw_nodes_on_canvas(o)
+            if o != 0:
+                self.draw_edges_on_canvas(o)
+        self._prune_items(columns)
+
+    def draw_dag(self):
+        """Lay out the DAG, then draw the columns in view, reusing items (and the zoom/pan) of earlier draws."""
+        if self.collapse_columns.get():
+            # Finding the collapsible kinds analyzes every offset, so it is only redone when
+            # _offset_stats takes new stats, not on every live tick
+            stats = self._offset_stats()
+            if stats is not self._collapsed_from:
+                self._collapsed = frozenset(o for o, st in enumerate(stats) if st["kind"] in Dag.COLLAPSIBLE)
+                self._collapsed_from = stats
+        else:
+            self._collapsed, self._collapsed_from = frozenset(), None
+        self._layout = self.engine.layout(self.filter_seeds, self._collapsed)
+        matched = self.matched
+        self._match_label.configure(text=f"{matched.index.rows:,} of {self.dag.index.rows:,} samples match" if matched is not None else "")
+        self._sync_viewport()
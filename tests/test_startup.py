@@ -0,0 +1,20 @@
+"""Startup budget: the bench_startup scenarios, held to its BUDGET_MS."""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+import bench_startup  # noqa: E402
+
+
+def test_scenarios_within_budget():
+    _, _, failures = bench_startup.measure(bench_startup.SCENARIOS, repeat=3, budget=bench_startup.BUDGET_MS)
+    assert failures == []
+
+
+def test_help_and_headless_skip_mode_modules():
+    scenarios = ["help", "counts", "svg"]
+    _, imports_by_scenario, _ = bench_startup.measure(scenarios, repeat=1)
+    for scenario, imports in zip(scenarios, imports_by_scenario):
+        loaded = {name for name, _, _ in imports}
+        assert not loaded & {"tkinter", "sqlite3", "multiprocessing"}, scenario